@@ -1,101 +1,564 @@
 # =================================================================
 # Section 1: Imports and Flask App Initialization
 # =================================================================
-from flask import Flask, Response, jsonify
+from flask import Flask, Response, jsonify, abort, request
+from html import escape
+from urllib.parse import quote
+from collections import OrderedDict, deque
+import atexit
+import json
+import selectors
 import socket
-import struct
 import threading
 import time
 import traceback
 import cv2
 import numpy as np
-from fall_detection import process_frame
+from stream_protocol import (CAP_ACK, KIND_FRAME, KIND_HEARTBEAT, FrameReader, ProtocolError, pack_ack,
+                             pack_feedback, pack_welcome, parse_hello)
+from event_recorder import CameraRecorder, ClipWriter
+from inference_workers import InferenceWorkerPool
+import metrics
+from metrics import DEBUG_LOGGING, counter, gauge_callback, histogram
 
 app = Flask(__name__)
 
 # =================================================================
-# Section 2: Global Variables
+# Section 2: Per-Camera State
 # =================================================================
-latest_frame_jpeg = None
-frame_lock = threading.Lock()
-fall_warning = "No Fall Detected"
+SOCKET_HOST = '0.0.0.0'
+SOCKET_PORT = 9999
+ANNOTATED_STALE_AFTER = 1.0   # Seconds after which the annotated feed falls back to raw frames
+ANNOTATED_MAX_WIDTH = 480     # The annotated feed is decoded at 1/2, 1/4 or 1/8 size to fit this width
+ANNOTATED_JPEG_QUALITY = 70
+VIEWER_KEEPALIVE = 5.0        # Re-send the current frame this often so dead viewers get noticed
+FEEDBACK_INTERVAL = 1.0       # Seconds between rate reports sent back to each sender
+HTTP_PORT = 5000
+FALL_EVENT_BACKLOG = 256      # Recent fall events replayed to dashboards that reconnect
+EVENT_KEEPALIVE = 15.0        # Seconds between SSE comments that keep idle dashboard connections open
+INFERENCE_WORKERS = 0         # Worker processes for fall detection (see inference_workers.py); 0 runs it in a thread
+SENDER_TIMEOUT = 15.0         # Seconds of silence (no frame, no heartbeat) after which a v2 sender is dropped
+MAX_CAPTURE_AGE = 10.0        # Larger capture-to-arrival times are taken as sender clock skew and ignored
+OUTGOING_LIMIT = 64 * 1024    # Bytes of acks/feedback kept for a sender that does not read them
+
+class FrameBroadcaster:
+    """
+    Fan-out point of one MJPEG stream. Each new frame is wrapped into its
+    multipart chunk once; every viewer blocks until the sequence number
+    advances and then takes the newest chunk. A slow viewer simply skips
+    the frames it missed instead of queueing them.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunk = None
+        self._seq = 0
+        self.viewers = 0
+
+    def wrap(self, jpeg):
+        return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
+    def publish(self, payload):
+        chunk = self.wrap(payload)
+        with self._cond:
+            self._chunk = chunk
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait_next(self, last_seq, timeout):
+        """Returns (seq, chunk) once a frame newer than last_seq exists, or (last_seq, None) on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._chunk
+
+    def stream(self):
+        """Generator for one viewer's multipart response."""
+        with self._cond:
+            self.viewers += 1
+        try:
+            seq = 0
+            while True:
+                seq, chunk = self.wait_next(seq, VIEWER_KEEPALIVE)
+                if chunk is None:
+                    with self._cond:
+                        chunk = self._chunk
+                    if chunk is None:
+                        continue
+                yield chunk
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+class DetectionBroadcaster(FrameBroadcaster):
+    """
+    Latest detection result of one camera as Server-Sent Events, for
+    dashboards that draw the overlays themselves. Like video viewers, a slow
+    client skips results instead of queueing them.
+    """
+    def wrap(self, metadata):
+        return f"event: detections\ndata: {json.dumps(metadata)}\n\n".encode()
+
+class FallEventHub:
+    """
+    Fall state changes of all cameras, pushed to dashboards as Server-Sent
+    Events. Subscribers sleep until an event is published, so an idle
+    dashboard costs nothing. Events get increasing IDs and the last few are
+    kept, so a browser reconnecting with Last-Event-ID gets what it missed.
+    """
+    def __init__(self, backlog=FALL_EVENT_BACKLOG):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)   # (event_id, camera_id, json)
+        self._last_id = 0
+        self.subscribers = 0
+
+    def publish(self, event):
+        data = json.dumps(event)
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event["camera"], data))
+            self._cond.notify_all()
+
+    def events_after(self, last_id, timeout):
+        """Events newer than last_id, waiting up to timeout for one to be published."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+            return [event for event in self._events if event[0] > last_id]
+
+    def stream(self, last_id=None, camera_id=None):
+        """Generator for one dashboard's text/event-stream response, optionally for one camera only."""
+        with self._cond:
+            self.subscribers += 1
+            # Unknown or future IDs (e.g. from before a server restart) start from now
+            if last_id is None or last_id > self._last_id:
+                last_id = self._last_id
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                events = self.events_after(last_id, EVENT_KEEPALIVE)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                last_id = events[-1][0]
+                payload = "".join(f"id: {event_id}\nevent: fall\ndata: {data}\n\n"
+                                  for event_id, event_camera, data in events
+                                  if camera_id is None or event_camera == camera_id)
+                if payload:
+                    yield payload
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+fall_events = FallEventHub()
+
+class CameraState:
+    """Frame slots, detection state and fall status for one camera stream."""
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.frame_lock = threading.Lock()
+        self.latest_frame_jpeg = None      # raw frame exactly as received; only the receiver writes it
+        self.frame_seq = 0                 # bumped for every frame received from the sender
+        self.sender_seq = 0                # last sequence number of a v2 sender; survives reconnects
+        self.protocol_version = None       # wire protocol of the current connection
+        self.annotated_seq = 0             # frame_seq the last annotated frame was made from
+        self.annotated_time = 0.0          # when the annotate stage last published; 0 if never
+        self.last_detection = None         # metadata of the newest analysed frame, as sent on /detections
+        self.detected_seq = 0              # frame_seq of the last frame that went through detection
+        self.detected_frames = 0           # frames that went through detection, for the inference rate
+        self.detection_state = None        # fall_detection_1.DetectionState, created once detection is ready
+        self.worker_gate_counts = (0, 0)   # motion gate counts reported by the camera's inference worker
+        self.fall_warning = "No Fall Detected"
+        self.fallen_people = {}            # track_id -> fall score of people currently fallen
+        self.connected = False
+        self.connection = None             # SenderConnection currently streaming this camera
+        self.broadcaster = FrameBroadcaster()             # raw frames, the default video feed
+        self.annotated_broadcaster = FrameBroadcaster()   # overlays drawn by the server, on request only
+        self.detections = DetectionBroadcaster()
+        self.recorder = CameraRecorder(camera_id, clip_writer)
+
+    def annotated_is_fresh(self):
+        return time.monotonic() - self.annotated_time < ANNOTATED_STALE_AFTER
+
+clip_writer = ClipWriter()   # saves the pre/post-event clips of every camera
+
+cameras = {}
+cameras_lock = threading.Lock()
+
+class DetectorStatus:
+    """
+    Readiness of fall detection. The models load in the background (see
+    model_loader_thread, or the inference workers) so video ingest and viewing
+    work from the start; frames only enter the inference pipeline once state
+    is "ready", or "degraded" when some inference workers failed and the
+    others took over their cameras.
+    """
+    def __init__(self):
+        self.state = "loading"       # "loading", "ready", "degraded" or "failed"
+        self.error = None
+        self.module = None           # fall_detection_1 once it is loaded (in-process detection only)
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.workers = {}            # inference worker index -> "ready" or "failed"
+
+    @property
+    def ready(self):
+        return self.state in ("ready", "degraded")
+
+    def worker_counts(self):
+        states = list(self.workers.values())
+        return {"total": INFERENCE_WORKERS, "ready": states.count("ready"), "failed": states.count("failed")}
+
+detector_status = DetectorStatus()
+process_start = time.monotonic()
+
+def get_camera(camera_id, create=False):
+    with cameras_lock:
+        camera = cameras.get(camera_id)
+        if camera is None and create:
+            camera = CameraState(camera_id)
+            cameras[camera_id] = camera
+        return camera
+
+def default_camera():
+    """The first camera that connected; serves the legacy single-stream routes."""
+    with cameras_lock:
+        return next(iter(cameras.values()), None)
+
+class LatestWinsQueue:
+    """
+    Bounded hand-off between two pipeline stages. It holds at most one item
+    per camera: putting a newer item replaces (drops) the pending older one,
+    so a slow stage always gets the freshest frame and never a backlog.
+    Cameras are served in the order their items became pending.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.dropped = 0
+        self._items = OrderedDict()
+        self._cond = threading.Condition()
+
+    def put(self, key, item):
+        with self._cond:
+            if self._items.pop(key, None) is not None:
+                self.dropped += 1
+            self._items[key] = item
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            return self._items.popitem(last=False)[1]
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+# receive -> decode -> detect [-> annotate]; items are (camera, frame_seq, captured_at, payload)
+# with captured_at the capture time in this process's time.monotonic() clock: from the
+# sender's timestamp for v2 senders, the arrival time for v1 senders. Only cameras with
+# viewers of the annotated feed go through the annotate stage.
+decode_queue = LatestWinsQueue("decode")
+detect_queue = LatestWinsQueue("detect")
+annotate_queue = LatestWinsQueue("annotate")
+inference_pool = None   # InferenceWorkerPool when INFERENCE_WORKERS > 0, created by main()
+
+def pipeline_queues():
+    if inference_pool is not None:
+        return inference_pool.queues() + [annotate_queue]
+    return [decode_queue, detect_queue, annotate_queue]
+
+# Metrics served on /metrics; see metrics.py
+FRAMES_RECEIVED = counter("fall_frames_received_total", "Frames received from senders", ("camera",))
+FRAMES_SUPERSEDED = counter("fall_frames_superseded_total",
+                            "Frames replaced by a newer one from the same read before decoding", ("camera",))
+BYTES_RECEIVED = counter("fall_bytes_received_total", "Bytes received from senders", ("camera",))
+FRAMES_LOST = counter("fall_frames_lost_total", "Gaps in the sequence numbers of v2 senders", ("camera",))
+HEARTBEATS = counter("fall_heartbeats_total", "Heartbeats received from v2 senders", ("camera",))
+CAPTURE_TO_RECEIVE_SECONDS = histogram("fall_capture_to_receive_seconds",
+                                       "Time from capture on a v2 sender to arrival at the backend", ("camera",))
+PIPELINE_STAGE_SECONDS = histogram("fall_pipeline_stage_seconds", "Time spent per item in each pipeline stage",
+                                   ("stage",))
+# Stage timings of process_frame reported by inference workers; in-process detection fills it directly
+DETECTION_STAGE_SECONDS = histogram("fall_detection_stage_seconds", "Time spent in each process_frame stage",
+                                    ("stage",))
+# Measured from capture (v2 senders) or arrival (v1 senders) until the detection result is published
+END_TO_END_SECONDS = histogram("fall_end_to_end_latency_seconds",
+                               "Time from capturing a frame to publishing its detection result", ("camera",))
+
+def gate_counts(camera):
+    """(frames analysed, frames skipped) by the camera's motion gate."""
+    if camera.detection_state is None:
+        return camera.worker_gate_counts
+    gate = camera.detection_state.motion_gate
+    return gate.frames_analysed, gate.frames_skipped
+
+def camera_samples(value):
+    with cameras_lock:
+        snapshot = list(cameras.values())
+    return [((camera.camera_id,), value(camera)) for camera in snapshot]
+
+gauge_callback("fall_pipeline_queue_depth", "Items waiting in front of each pipeline stage",
+               lambda: [((q.name,), q.qsize()) for q in pipeline_queues()], ("stage",))
+gauge_callback("fall_pipeline_dropped_total", "Items replaced by a newer one while waiting for a stage",
+               lambda: [((q.name,), q.dropped) for q in pipeline_queues()], ("stage",),
+               kind="counter")
+gauge_callback("fall_inference_oversized_total", "Frames too large for an inference worker slot, not analysed",
+               lambda: [((), inference_pool.oversized if inference_pool is not None else 0)], kind="counter")
+gauge_callback("fall_camera_connected", "1 while the camera's sender is connected",
+               lambda: camera_samples(lambda camera: int(camera.connected)), ("camera",))
+gauge_callback("fall_viewers", "Open MJPEG video feeds",
+               lambda: camera_samples(lambda camera: camera.broadcaster.viewers), ("camera",))
+gauge_callback("fall_annotated_viewers", "Open MJPEG video feeds with server-drawn overlays",
+               lambda: camera_samples(lambda camera: camera.annotated_broadcaster.viewers), ("camera",))
+gauge_callback("fall_frames_analysed_total", "Frames that went through full detection",
+               lambda: camera_samples(lambda camera: gate_counts(camera)[0]), ("camera",),
+               kind="counter")
+gauge_callback("fall_frames_gated_total", "Frames that skipped detection for lack of motion",
+               lambda: camera_samples(lambda camera: gate_counts(camera)[1]), ("camera",),
+               kind="counter")
+gauge_callback("fall_detected", "1 while a fall is detected on the camera",
+               lambda: camera_samples(lambda camera: int(camera.fall_warning == "Fall Detected!")), ("camera",))
+gauge_callback("fall_detector_ready", "1 once the fall detection models are loaded and warmed up",
+               lambda: [((), int(detector_status.ready))])
+gauge_callback("fall_dashboards", "Dashboards subscribed to fall events", lambda: [((), fall_events.subscribers)])
+gauge_callback("fall_clips_written_total", "Fall clips saved to disk", lambda: [((), clip_writer.written)],
+               kind="counter")
+gauge_callback("fall_clips_dropped_total", "Fall clips dropped because the writer was behind",
+               lambda: [((), clip_writer.dropped)], kind="counter")
 
 # =================================================================
-# Section 3: Socket Server Thread for Receiving Image Data
+# Section 3: Socket Server for Receiving Image Data
 # =================================================================
+class SenderConnection:
+    """Receive buffer and handshake state for one connected sender."""
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.reader = FrameReader()
+        self.camera = None
+        self._frames_metric = None
+        self._bytes_metric = None
+        self.sent_hello = False
+        self.version = 1
+        self.wants_acks = False
+        self.last_message = time.monotonic()   # for dropping v2 senders that went silent
+        # Rate accounting for the feedback sent back to the sender
+        self.frames_received = 0
+        self.bytes_received = 0
+        self._last_report = (time.monotonic(), 0, 0, 0)
+        self._outgoing = b""
+
+    def handle_readable(self):
+        """Reads what is available and stores completed frames. Returns False once the sender is gone."""
+        received = self.reader.recv_from(self.conn)
+        if received == 0:
+            print(f"[*] Client {self.addr} disconnected")
+            return False
+        self.bytes_received += received
+        if self.camera is None and not self._handshake():
+            return True
+        self._bytes_metric.inc(received)
+        try:
+            self._store_frames()
+        except ProtocolError as e:
+            print(f"[!] Client {self.addr} sent a corrupt frame header: {e}")
+            return False
+        return True
+
+    def _handshake(self):
+        try:
+            camera_id, consumed, version, flags = parse_hello(self.reader.pending())
+        except BufferError:
+            return False
+        if camera_id is None:
+            camera_id = self.addr[0]
+            print(f"[*] Client {self.addr} sent no camera ID; using '{camera_id}'")
+        else:
+            self.sent_hello = True
+        self.reader.consume(consumed)
+        self.camera = get_camera(camera_id, create=True)
+        self.camera.connected = True
+        # A reconnecting sender may arrive before its old, half-open connection is dropped
+        self.camera.connection = self
+        self.camera.protocol_version = version
+        self._frames_metric = FRAMES_RECEIVED.labels(camera_id)
+        self._bytes_metric = BYTES_RECEIVED.labels(camera_id)
+        if version >= 2:
+            self.version = self.reader.version = 2
+            self.wants_acks = bool(flags & CAP_ACK)
+            # Tells a reconnecting sender where the backend's sequence for this camera stands
+            self._send(pack_welcome(self.camera.sender_seq, flags & CAP_ACK))
+        print(f"[*] Client {self.addr} streams camera '{camera_id}' (protocol v{self.version})")
+        return True
+
+    def _store_frames(self):
+        newest = None
+        newest_header = None
+        frames = 0
+        acked = None
+        while True:
+            message = self.reader.next_message()
+            if message is None:
+                break
+            header, payload = message
+            if header is not None:
+                if header.camera_id != self.camera.camera_id:
+                    raise ProtocolError(f"message for camera '{header.camera_id}' on the stream of "
+                                        f"'{self.camera.camera_id}'")
+                acked = header
+                if header.kind == KIND_HEARTBEAT:
+                    HEARTBEATS.labels(self.camera.camera_id).inc()
+                    continue
+                if header.kind != KIND_FRAME:
+                    continue
+                self._track_sequence(header.seq)
+                newest_header = header
+            newest = payload
+            frames += 1
+        if self.version >= 2:
+            self.last_message = time.monotonic()
+            if acked is not None and self.wants_acks:
+                self._send(pack_ack(acked.seq, acked.capture_time))
+        self.frames_received += frames
+        if newest is not None:
+            captured_at = time.monotonic()
+            if newest_header is not None:
+                # The sender's wall-clock capture time, moved into this process's monotonic clock
+                age = time.time() - newest_header.capture_time
+                if 0.0 <= age <= MAX_CAPTURE_AGE:
+                    CAPTURE_TO_RECEIVE_SECONDS.labels(self.camera.camera_id).observe(age)
+                    captured_at -= age
+            self._frames_metric.inc(frames)
+            if frames > 1:
+                FRAMES_SUPERSEDED.labels(self.camera.camera_id).inc(frames - 1)
+            # Only the newest complete frame matters to viewers and detection, so
+            # it is the only one copied out of the receive buffer
+            frame_data = bytes(newest)
+            with self.camera.frame_lock:
+                self.camera.latest_frame_jpeg = frame_data
+                self.camera.frame_seq += frames
+                frame_seq = self.camera.frame_seq
+            self.camera.recorder.add_frame(frame_data)
+            # The default feed is the sender's JPEG as is; the annotated feed shows
+            # raw frames too while detection is not keeping up
+            self.camera.broadcaster.publish(frame_data)
+            if self.camera.annotated_broadcaster.viewers and not self.camera.annotated_is_fresh():
+                self.camera.annotated_broadcaster.publish(frame_data)
+            if not detector_status.ready:
+                return
+            if inference_pool is not None:
+                inference_pool.submit(self.camera, frame_seq, captured_at, frame_data)
+            else:
+                decode_queue.put(self.camera.camera_id, (self.camera, frame_seq, captured_at, frame_data))
+
+    def _track_sequence(self, seq):
+        """Counts frames missing between the camera's last sequence number and seq."""
+        last = self.camera.sender_seq
+        if last and seq > last + 1:
+            FRAMES_LOST.labels(self.camera.camera_id).inc(seq - last - 1)
+        # A lower number means the sender restarted its count; start over from it
+        self.camera.sender_seq = seq
+
+    def _send(self, data):
+        """Queues a control message and sends what the socket takes right away, never blocking the ingest loop."""
+        if data and len(self._outgoing) + len(data) > OUTGOING_LIMIT:
+            return
+        self._outgoing += data
+        if not self._outgoing:
+            return
+        try:
+            sent = self.conn.send(self._outgoing)
+        except (BlockingIOError, InterruptedError):
+            return
+        self._outgoing = self._outgoing[sent:]
+
+    def send_feedback(self, now):
+        """Reports receive and inference rates since the last report. Only senders that sent a hello read them."""
+        if not self.sent_hello:
+            return
+        last_time, last_frames, last_bytes, last_detected = self._last_report
+        elapsed = max(now - last_time, 1e-3)
+        detected = self.camera.detected_frames
+        report = b""
+        if not self._outgoing:
+            report = pack_feedback((self.frames_received - last_frames) / elapsed,
+                                   (detected - last_detected) / elapsed,
+                                   (self.bytes_received - last_bytes) * 8 / 1000 / elapsed)
+        self._last_report = (now, self.frames_received, self.bytes_received, detected)
+        # A partially sent report is finished on a later tick
+        self._send(report)
+
+    def timed_out(self, now):
+        return self.version >= 2 and now - self.last_message > SENDER_TIMEOUT
+
+    def close(self):
+        if self.camera is not None and self.camera.connection is self:
+            self.camera.connected = False
+            self.camera.connection = None
+            # No more frames will extend a clip being recorded; save it now
+            self.camera.recorder.flush()
+        print(f"[*] Closed connection from {self.addr}")
+        self.conn.close()
+
 def socket_server_thread():
-    global latest_frame_jpeg
+    """Serves any number of concurrent senders from one selector loop."""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(('0.0.0.0', 9999))
-    server_socket.listen(5)
-    print("[*] Socket server is listening on 0.0.0.0:9999")
-    payload_size = struct.calcsize(">L")
+    server_socket.bind((SOCKET_HOST, SOCKET_PORT))
+    server_socket.listen(16)
+    server_socket.setblocking(False)
+    print(f"[*] Socket server is listening on {SOCKET_HOST}:{SOCKET_PORT}")
 
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ, data=None)
+    next_feedback = time.monotonic() + FEEDBACK_INTERVAL
     while True:
-        conn = None
-        addr = None
-        try:
-            conn, addr = server_socket.accept()
-            print(f"[*] Accepted connection from {addr}")
-            data = b""
-            while True:
-                while len(data) < payload_size:
-                    packet = conn.recv(4096)
-                    if not packet:
-                        break
-                    data += packet
-                if not packet:
-                    print(f"[*] Client {addr} disconnected (payload size)")
-                    break
-
-                packed_msg_size = data[:payload_size]
-                data = data[payload_size:]
-                if len(packed_msg_size) < payload_size:
-                    print(f"[*] Client {addr} disconnected (incomplete size)")
-                    break
-
-                msg_size = struct.unpack(">L", packed_msg_size)[0]
-                while len(data) < msg_size:
-                    packet = conn.recv(4096)
-                    if not packet:
-                        break
-                    data += packet
-                if not packet:
-                    print(f"[*] Client {addr} disconnected (data reception)")
-                    break
-                if len(data) < msg_size:
-                    print(f"[*] Client {addr} disconnected (incomplete data)")
-                    break
-
-                frame_data = data[:msg_size]
-                data = data[msg_size:]
-                with frame_lock:
-                    latest_frame_jpeg = frame_data
-        except Exception as e:
-            print(f"[!] Socket thread error: {e}")
-            traceback.print_exc()
-        finally:
-            if conn:
-                print(f"[*] Closed connection from {addr}")
-                conn.close()
-            time.sleep(0.5)
+        now = time.monotonic()
+        if now >= next_feedback:
+            next_feedback = now + FEEDBACK_INTERVAL
+            for key in list(selector.get_map().values()):
+                if key.data is not None and key.data.camera is not None:
+                    if key.data.timed_out(now):
+                        # Half-open connection: the sender vanished without closing it
+                        print(f"[!] Client {key.data.addr} sent nothing for {SENDER_TIMEOUT:.0f}s; dropping it")
+                        selector.unregister(key.data.conn)
+                        key.data.close()
+                        continue
+                    try:
+                        key.data.send_feedback(now)
+                    except OSError as e:
+                        print(f"[!] Could not send feedback to {key.data.addr}: {e}")
+        for key, _ in selector.select(timeout=max(0.0, next_feedback - time.monotonic())):
+            if key.data is None:
+                try:
+                    conn, addr = server_socket.accept()
+                except (BlockingIOError, InterruptedError):
+                    continue
+                print(f"[*] Accepted connection from {addr}")
+                conn.setblocking(False)
+                selector.register(conn, selectors.EVENT_READ, data=SenderConnection(conn, addr))
+                continue
+
+            sender = key.data
+            try:
+                keep_open = sender.handle_readable()
+            except (BlockingIOError, InterruptedError):
+                continue
+            except Exception as e:
+                print(f"[!] Socket error from {sender.addr}: {e}")
+                traceback.print_exc()
+                keep_open = False
+            if not keep_open:
+                selector.unregister(sender.conn)
+                sender.close()
 
 # =================================================================
 # Section 4: Frame Generator for the Video Feed
 # =================================================================
-def generate_frames():
-    while True:
-        frame_to_send = None
-        with frame_lock:
-            if latest_frame_jpeg:
-                frame_to_send = latest_frame_jpeg
-        if frame_to_send is None:
-            time.sleep(0.1)
-            continue
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_to_send + b'\r\n')
-        time.sleep(0.03)
+def generate_frames(camera, annotated=False):
+    if annotated:
+        return camera.annotated_broadcaster.stream()
+    return camera.broadcaster.stream()
 
 # =================================================================
 # Section 5: Flask Routes
@@ -103,30 +566,77 @@ def generate_frames():
 @app.route('/')
 def index():
     vm_tailscale_ip = "change to your ip"
+    with cameras_lock:
+        snapshot = list(cameras.values())
+    # Camera IDs come from the network, so escape them before they reach the page
+    camera_blocks = "".join(f"""
+        <div class="camera" data-camera="{escape(camera.camera_id)}">
+            <h2>Camera: {escape(camera.camera_id)}</h2>
+            <div style="position: relative; width: 640px; height: 480px;">
+                <img src="/video_feed/{quote(camera.camera_id, safe='')}" width="640" height="480">
+                <canvas class="overlay" width="640" height="480" style="position: absolute; left: 0; top: 0;"></canvas>
+            </div>
+            <h3>Fall Warning:</h3>
+            <div class="fall_warning" style="font-size: 24px; color: red;">{escape(camera.fall_warning)}</div>
+            <div class="fall_detail"></div>
+        </div>""" for camera in snapshot) or "<p>No camera connected yet.</p>"
     return f"""
     <html>
     <head>
         <title>Raspberry Pi Video Streaming (Tailscale)</title>
         <script>
-            async function updateFallStatus() {{
-                try {{
-                    let response = await fetch('/fall_status');
-                    let data = await response.json();
-                    document.getElementById('fall_warning').innerText = data.status;
-                }} catch (error) {{
-                    console.error('Failed to fetch fall status:', error);
+            // The server pushes an event whenever a person's fall state changes
+            const fallEvents = new EventSource('/fall_events');
+            fallEvents.addEventListener('fall', (message) => {{
+                const data = JSON.parse(message.data);
+                for (const block of document.querySelectorAll('.camera')) {{
+                    if (block.dataset.camera !== data.camera) continue;
+                    block.querySelector('.fall_warning').innerText = data.status;
+                    const time = new Date(data.timestamp * 1000).toLocaleTimeString();
+                    const score = data.score === null ? '' : ` (score ${{data.score.toFixed(2)}})`;
+                    block.querySelector('.fall_detail').innerText =
+                        `Person ${{data.person}} ${{data.fall ? 'fell' : 'recovered'}} at ${{time}}${{score}}`;
+                }}
+            }});
+
+            // Boxes, scores and landmarks arrive as metadata and are drawn over the raw video
+            function drawDetections(canvas, data) {{
+                const ctx = canvas.getContext('2d');
+                // The image is stretched to the canvas size, so x and y scale separately
+                const sx = canvas.width / data.width, sy = canvas.height / data.height;
+                ctx.clearRect(0, 0, canvas.width, canvas.height);
+                ctx.font = '14px sans-serif';
+                ctx.strokeStyle = 'rgb(0, 128, 255)';
+                ctx.lineWidth = 1;
+                for (const item of data.objects) {{
+                    const [x1, y1, x2, y2] = item.box;
+                    ctx.strokeRect(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy);
+                }}
+                for (const person of data.people) {{
+                    const [x1, y1, x2, y2] = person.box;
+                    const color = person.fallen ? 'red' : 'lime';
+                    ctx.strokeStyle = ctx.fillStyle = color;
+                    ctx.lineWidth = 2;
+                    ctx.strokeRect(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy);
+                    ctx.fillText(`ID ${{person.id}} Fall Score: ${{person.score.toFixed(2)}}`, x1 * sx, y1 * sy - 5);
+                    for (const [x, y, visibility] of person.landmarks || []) {{
+                        if (visibility >= 0.5) ctx.fillRect(x * sx - 2, y * sy - 2, 4, 4);
+                    }}
                 }}
             }}
-            setInterval(updateFallStatus, 1000);
-            window.onload = updateFallStatus;
+            window.addEventListener('load', () => {{
+                for (const block of document.querySelectorAll('.camera')) {{
+                    const canvas = block.querySelector('.overlay');
+                    const detections = new EventSource('/detections/' + encodeURIComponent(block.dataset.camera));
+                    detections.addEventListener('detections', (message) => drawDetections(canvas, JSON.parse(message.data)));
+                }}
+            }});
         </script>
     </head>
     <body>
         <h1>Real-time Video from Raspberry Pi (Tailscale)</h1>
         <p>Access this page using the VM's Tailscale IP: http://{vm_tailscale_ip}:{5000}</p>
-        <img src="/video_feed" width="640" height="480">
-        <h2>Fall Warning:</h2>
-        <div id="fall_warning" style="font-size: 24px; color: red;">No Fall Detected</div>
+        {camera_blocks}
         <p>Server Time: <span id="time"></span></p>
          <script>
             function updateTime() {{
@@ -139,47 +649,334 @@ def index():
     </html>
     """
 
+@app.route('/cameras')
+def list_cameras():
+    with cameras_lock:
+        snapshot = list(cameras.values())
+    return jsonify(cameras=[{"id": camera.camera_id,
+                             "connected": camera.connected,
+                             "frames": camera.frame_seq,
+                             "protocol": camera.protocol_version,
+                             "sequence": camera.sender_seq,
+                             "viewers": camera.broadcaster.viewers,
+                             "annotated_viewers": camera.annotated_broadcaster.viewers,
+                             "frames_analysed": gate_counts(camera)[0],
+                             "frames_skipped": gate_counts(camera)[1],
+                             "status": camera.fall_warning} for camera in snapshot],
+                   dashboards=fall_events.subscribers)
+
+@app.route('/healthz')
+def healthz():
+    """
+    Always answers while the server runs; 503 until fall detection is ready
+    (or when it failed to load). "degraded" (200) means some inference workers
+    failed and the rest serve all cameras.
+    """
+    with cameras_lock:
+        connected = sum(camera.connected for camera in cameras.values())
+    body = {"status": "ok" if detector_status.state == "ready" else detector_status.state,
+            "detector": detector_status.state,
+            "error": detector_status.error,
+            "uptime": round(time.monotonic() - process_start, 3),
+            "model_load_seconds": detector_status.load_seconds,
+            "warmup_seconds": detector_status.warmup_seconds,
+            "cameras_connected": connected}
+    if INFERENCE_WORKERS > 0:
+        body["workers"] = detector_status.worker_counts()
+    return jsonify(body), 200 if detector_status.ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(),
+    """The camera's frames as sent; ?annotated=1 for a reduced-size feed with overlays drawn by the server."""
+    camera = default_camera()
+    if camera is None:
+        abort(404)
+    return Response(generate_frames(camera, request.args.get('annotated') == '1'),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/video_feed/<camera_id>')
+def camera_video_feed(camera_id):
+    camera = get_camera(camera_id)
+    if camera is None:
+        abort(404)
+    return Response(generate_frames(camera, request.args.get('annotated') == '1'),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+def detection_stream_response(camera):
+    if camera is None:
+        abort(404)
+    return Response(camera.detections.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/detections')
+def detection_stream():
+    """Server-Sent Events: boxes, landmarks and fall scores of every analysed frame, newest only."""
+    return detection_stream_response(default_camera())
+
+@app.route('/detections/<camera_id>')
+def camera_detection_stream(camera_id):
+    return detection_stream_response(get_camera(camera_id))
+
 @app.route('/fall_status')
 def fall_status():
-    global fall_warning
-    return jsonify(status=fall_warning)
+    camera = default_camera()
+    return jsonify(status=camera.fall_warning if camera else "No Fall Detected")
+
+@app.route('/fall_status/<camera_id>')
+def camera_fall_status(camera_id):
+    camera = get_camera(camera_id)
+    if camera is None:
+        abort(404)
+    return jsonify(camera=camera.camera_id, status=camera.fall_warning)
+
+def event_stream_response(camera_id=None):
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_id = None
+    return Response(fall_events.stream(last_id, camera_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/fall_events')
+def fall_event_stream():
+    """Server-Sent Events: one message per person whose fall state changed, on any camera."""
+    return event_stream_response()
+
+@app.route('/fall_events/<camera_id>')
+def camera_fall_event_stream(camera_id):
+    if get_camera(camera_id) is None:
+        abort(404)
+    return event_stream_response(camera_id)
 
 # =================================================================
-# Section 6: Fall Detection Thread
+# Section 6: Inference Pipeline
 # =================================================================
-def fall_detection_thread():
-    global latest_frame_jpeg, fall_warning
+def decode_stage(item):
+    camera, frame_seq, captured_at, frame_data = item
+    frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is not None:
+        detect_queue.put(camera.camera_id, (camera, frame_seq, captured_at, (frame_data, frame)))
+
+def detect_stage(item):
+    camera, frame_seq, captured_at, (frame_data, frame) = item
+    if frame_seq <= camera.detected_seq:
+        return
+    camera.detected_seq = frame_seq
+    fall_detection = detector_status.module
+    if camera.detection_state is None:
+        camera.detection_state = fall_detection.DetectionState()
+    gate = camera.detection_state.motion_gate
+    analysed = gate.frames_analysed
+    fall_detected, _ = fall_detection.process_frame(frame, camera.detection_state, annotate=False)
+    record_detection(camera, fall_detected, camera.detection_state.last_overlays,
+                     camera.detection_state.fallen_people, gate.frames_analysed != analysed)
+    publish_detection(camera, frame_seq, captured_at, frame_data,
+                      fall_detection.detection_metadata(camera.detection_state, frame))
+
+def record_detection(camera, fall_detected, overlays, fallen_people, analysed):
+    """
+    Bookkeeping after a frame went through detection: rates, recorder, fall
+    status and events. analysed is False for frames the motion gate skipped;
+    their overlays repeat the last scores, which the clip sidecar must not
+    record again as new ones.
+    """
+    camera.detected_frames += 1
+    if analysed:
+        camera.recorder.add_scores({track_id: round(fall_score, 3) for _, track_id, fall_score, _ in overlays})
+    if fall_detected and camera.fall_warning != "Fall Detected!":
+        camera.recorder.trigger("fall detected")
+    update_fall_status(camera, fall_detected, overlays, fallen_people)
+    if fall_detected and DEBUG_LOGGING:
+        print(f"[DEBUG] Fall or abnormal movement detected on camera '{camera.camera_id}'!")
+
+def update_fall_status(camera, fall_detected, overlays, fallen_people):
+    """
+    Sets the camera's fall status and pushes one event per person whose fall
+    state changed. overlays are the (box, track_id, fall_score, fallen) of the
+    frame; fallen_people ({track_id: fall_score}) every tracked person whose
+    fall is confirmed, including people missed in this frame.
+    """
+    camera.fall_warning = "Fall Detected!" if fall_detected else "No Fall Detected"
+    now = time.time()
+    scores = {track_id: fall_score for _, track_id, fall_score, _ in overlays}
+    changes = [(track_id, score, True) for track_id, score in fallen_people.items()
+               if track_id not in camera.fallen_people]
+    # A fall ends when the person's state machine recovers or their track expires,
+    # never just because one frame has no box for them
+    changes += [(track_id, scores.get(track_id), False) for track_id in camera.fallen_people
+                if track_id not in fallen_people]
+    camera.fallen_people = dict(fallen_people)
+    for track_id, score, person_fallen in changes:
+        fall_events.publish({"camera": camera.camera_id,
+                             "person": track_id,
+                             "fall": person_fallen,
+                             "score": None if score is None else round(score, 3),
+                             "status": camera.fall_warning,
+                             "timestamp": now})
+
+def publish_detection(camera, frame_seq, captured_at, frame_data, metadata):
+    """
+    Sends a frame's detection result to the dashboards and, only while someone
+    watches the annotated feed, queues the frame for the annotate stage.
+    """
+    metadata.update(camera=camera.camera_id, seq=frame_seq, timestamp=time.time())
+    camera.last_detection = metadata
+    camera.detections.publish(metadata)
+    END_TO_END_SECONDS.labels(camera.camera_id).observe(time.monotonic() - captured_at)
+    if camera.annotated_broadcaster.viewers:
+        annotate_queue.put(camera.camera_id, (camera, frame_seq, captured_at, (frame_data, metadata)))
+
+def draw_detection_metadata(image, metadata, scale):
+    """Draws the boxes, scores and landmarks of detection metadata onto an image scaled by scale."""
+    def point(x, y):
+        return int(x * scale), int(y * scale)
+    for item in metadata["objects"]:
+        x1, y1, x2, y2 = item["box"]
+        cv2.rectangle(image, point(x1, y1), point(x2, y2), (255, 128, 0), 1)
+    for person in metadata["people"]:
+        x1, y1, x2, y2 = person["box"]
+        color = (0, 0, 255) if person["fallen"] else (0, 255, 0)
+        cv2.rectangle(image, point(x1, y1), point(x2, y2), color, 2)
+        cv2.putText(image, f"ID {person['id']} Fall Score: {person['score']:.2f}", point(x1, y1 - 10 / scale),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        for x, y, visibility in person["landmarks"] or ():
+            if visibility >= 0.5:
+                cv2.circle(image, point(x, y), 2, color, -1)
+
+def annotate_stage(item):
+    """Renders the annotated feed: the received JPEG decoded at reduced size, overlays drawn, re-encoded."""
+    camera, frame_seq, captured_at, (frame_data, metadata) = item
+    if frame_seq <= camera.annotated_seq:
+        return
+    # libjpeg scales while decoding, which is much cheaper than decoding at full size and resizing
+    reduction = 1
+    while reduction < 8 and metadata["width"] / reduction > ANNOTATED_MAX_WIDTH:
+        reduction *= 2
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[reduction]
+    frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), flags)
+    if frame is None:
+        return
+    draw_detection_metadata(frame, metadata, frame.shape[1] / metadata["width"])
+    ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, ANNOTATED_JPEG_QUALITY])
+    if not ret:
+        return
+    with camera.frame_lock:
+        if frame_seq <= camera.annotated_seq:
+            return
+        camera.annotated_seq = frame_seq
+        camera.annotated_time = time.monotonic()
+    camera.annotated_broadcaster.publish(jpeg.tobytes())
+
+def pipeline_stage_thread(in_queue, handler):
+    """Runs one pipeline stage: takes the freshest pending item and hands the result on."""
+    stage_seconds = PIPELINE_STAGE_SECONDS.labels(in_queue.name)
     while True:
-        frame_data = None
-        with frame_lock:
-            if latest_frame_jpeg:
-                frame_data = latest_frame_jpeg[:]
-        if frame_data:
-            np_data = np.frombuffer(frame_data, np.uint8)
-            frame = cv2.imdecode(np_data, cv2.IMREAD_COLOR)
-            if frame is not None:
-                fall_detected, annotated_frame = process_frame(frame)
-                ret, jpeg = cv2.imencode('.jpg', annotated_frame)
-                if ret:
-                    with frame_lock:
-                        latest_frame_jpeg = jpeg.tobytes()
-                fall_warning = "Fall Detected!" if fall_detected else "No Fall Detected"
-                if fall_detected:
-                    print("[INFO] Fall or abnormal movement detected!")
-        time.sleep(0.2)
+        item = in_queue.get()
+        try:
+            with stage_seconds.time():
+                handler(item)
+        except Exception as e:
+            print(f"[!] {in_queue.name} stage error on camera '{item[0].camera_id}': {e}")
+            traceback.print_exc()
+
+# One thread per stage. Detection stays on a single thread: the YOLO model and the
+# per-camera DetectionState are not safe to use from several threads at once.
+PIPELINE_STAGES = (
+    (decode_queue, decode_stage),
+    (detect_queue, detect_stage),
+)
+
+def model_loader_thread():
+    """
+    Imports fall_detection_1, loads its models and runs a warm-up inference.
+    Any failure leaves the server running without detection instead of killing it.
+    """
+    start = time.monotonic()
+    try:
+        import fall_detection_1
+        fall_detection_1.load_models()
+        loaded = time.monotonic()
+        fall_detection_1.warm_up()
+    except Exception as e:
+        detector_status.error = f"{type(e).__name__}: {e}"
+        detector_status.state = "failed"
+        print(f"[!] Fall detection unavailable, serving video only: {detector_status.error}")
+        traceback.print_exc()
+        return
+    detector_status.load_seconds = round(loaded - start, 3)
+    detector_status.warmup_seconds = round(time.monotonic() - loaded, 3)
+    detector_status.module = fall_detection_1
+    detector_status.state = "ready"
+    print(f"[*] Fall detection ready: models loaded in {detector_status.load_seconds:.1f}s, "
+          f"warm-up took {detector_status.warmup_seconds:.2f}s")
+
+def handle_worker_result(camera, frame_seq, captured_at, frame_data, fall_detected, overlays, fallen_people,
+                         metadata, gate, timings):
+    """Result of one frame from an inference worker; runs on the pool's result thread."""
+    if frame_seq <= camera.detected_seq:
+        return
+    camera.detected_seq = frame_seq
+    # The count changes (also when the camera moved to another worker) only for analysed frames
+    analysed = gate[0] != camera.worker_gate_counts[0]
+    camera.worker_gate_counts = gate
+    for stage, seconds in timings.items():
+        DETECTION_STAGE_SECONDS.labels(stage).observe(seconds)
+    record_detection(camera, fall_detected, overlays, fallen_people, analysed)
+    publish_detection(camera, frame_seq, captured_at, frame_data, metadata)
+
+def handle_worker_status(index, state, error, load_seconds, warmup_seconds):
+    """
+    Detection is ready once every worker has reported. Failed workers leave it
+    degraded, their cameras served by the others; it fails only with all of them.
+    """
+    detector_status.workers[index] = state
+    if state == "failed":
+        detector_status.error = f"worker {index}: {error}"
+        print(f"[!] Inference worker {index} failed: {error}")
+    else:
+        detector_status.load_seconds = max(detector_status.load_seconds or 0.0, round(load_seconds, 3))
+        detector_status.warmup_seconds = max(detector_status.warmup_seconds or 0.0, round(warmup_seconds, 3))
+        print(f"[*] Inference worker {index} ready: models loaded in {load_seconds:.1f}s, "
+              f"warm-up took {warmup_seconds:.2f}s")
+    counts = detector_status.worker_counts()
+    if counts["failed"] == INFERENCE_WORKERS:
+        detector_status.state = "failed"
+        print("[!] All inference workers failed, serving video only")
+    elif counts["ready"] + counts["failed"] == INFERENCE_WORKERS:
+        detector_status.state = "degraded" if counts["failed"] else "ready"
+
+def start_inference_workers():
+    global inference_pool
+    inference_pool = InferenceWorkerPool(INFERENCE_WORKERS, handle_worker_result, handle_worker_status,
+                                         LatestWinsQueue)
+    inference_pool.start()
+    atexit.register(inference_pool.stop)
+    print(f"[*] Fall detection runs in {INFERENCE_WORKERS} worker process(es)")
 
 # =================================================================
 # Section 7: Server Startup
 # =================================================================
-if __name__ == '__main__':
+def main():
+    # Video ingest and viewing start right away; detection joins once its models are loaded
     socket_thread = threading.Thread(target=socket_server_thread, daemon=True)
     socket_thread.start()
-    detection_thread = threading.Thread(target=fall_detection_thread, daemon=True)
-    detection_thread.start()
-    print("[*] Flask server is running on http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    clip_writer.start()
+    threading.Thread(target=pipeline_stage_thread, args=(annotate_queue, annotate_stage),
+                     name="annotate-stage", daemon=True).start()
+    if INFERENCE_WORKERS > 0:
+        start_inference_workers()
+    else:
+        for stage_queue, stage_handler in PIPELINE_STAGES:
+            threading.Thread(target=pipeline_stage_thread, args=(stage_queue, stage_handler),
+                             name=f"{stage_queue.name}-stage", daemon=True).start()
+        threading.Thread(target=model_loader_thread, name="model-loader", daemon=True).start()
+    print(f"[*] Flask server is running on http://0.0.0.0:{HTTP_PORT}")
+    app.run(host='0.0.0.0', port=HTTP_PORT, debug=False, threaded=True)
+
+if __name__ == '__main__':
+    main()
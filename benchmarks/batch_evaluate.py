@@ -0,0 +1,194 @@
+"""
+Headless batch run of the full fall detection pipeline (YOLO + MediaPipe +
+scoring) over a directory of videos and image sequences.
+
+Every video file and every sub-directory of images is one clip, replayed in
+its own time (frame index / fps) with a fresh DetectionState. The run reports
+per-stage latency percentiles (decode, gate, detect, pose, score, annotate),
+frames per second and peak RSS, and writes one row per person per frame to a
+CSV file, or Parquet if the output name ends in .parquet (needs pandas and
+pyarrow). --workers spreads clips over processes; each loads its own models.
+
+    python benchmarks/batch_evaluate.py clips/ --output scores.csv --workers 4
+
+The rows can be compared between runs to regression-test a model or threshold
+change.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".mjpeg", ".mjpg")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STAGES = ("decode", "gate", "detect", "pose", "score", "annotate", "total")
+COLUMNS = ("clip", "frame", "time", "person", "score", "state", "fall_detected", "frame_ms")
+VIDEO_FALLBACK_FPS = 30.0
+
+fd = None   # fall_detection_1, imported per process so every worker loads its own models
+
+# =================================================================
+# Section 1: Clip Discovery
+# =================================================================
+def find_clips(paths):
+    """Video files and image-sequence directories under the given paths, sorted by name."""
+    clips = []
+    for path in paths:
+        if os.path.isfile(path):
+            clips.append(path)
+            continue
+        if any(name.lower().endswith(IMAGE_EXTENSIONS) for name in os.listdir(path)):
+            clips.append(path)
+        for name in sorted(os.listdir(path)):
+            child = os.path.join(path, name)
+            if os.path.isdir(child) and any(f.lower().endswith(IMAGE_EXTENSIONS) for f in os.listdir(child)):
+                clips.append(child)
+            elif name.lower().endswith(VIDEO_EXTENSIONS):
+                clips.append(child)
+    return clips
+
+def read_frames(clip, image_fps):
+    """Yields (frame, time, decode seconds) for a video file or a directory of images."""
+    if os.path.isdir(clip):
+        images = sorted(f for f in os.listdir(clip) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(images):
+            start = time.perf_counter()
+            frame = cv2.imread(os.path.join(clip, name))
+            decode_seconds = time.perf_counter() - start
+            if frame is not None:
+                yield frame, index / image_fps, decode_seconds
+        return
+    cap = cv2.VideoCapture(clip)
+    fps = cap.get(cv2.CAP_PROP_FPS) or VIDEO_FALLBACK_FPS
+    index = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            decode_seconds = time.perf_counter() - start
+            if not ret:
+                break
+            yield frame, index / fps, decode_seconds
+            index += 1
+    finally:
+        cap.release()
+
+# =================================================================
+# Section 2: Running One Clip
+# =================================================================
+def init_worker(no_gate):
+    global fd
+    import fall_detection_1
+    fd = fall_detection_1
+    if no_gate:
+        fd.MOTION_AREA_THRESHOLD = 0.0   # every frame goes through detection
+
+def run_clip(clip, image_fps, max_frames):
+    """Returns (clip, rows, timings, frames, seconds, fall events, peak RSS in KB) for one clip."""
+    state = fd.DetectionState()
+    timings = {}
+    rows = []
+    frames = 0
+    clip_start = time.perf_counter()
+    for frame, frame_time, decode_seconds in read_frames(clip, image_fps):
+        timings.setdefault("decode", []).append(decode_seconds)
+        start = time.perf_counter()
+        fd.process_frame(frame, state, now=frame_time, timings=timings)
+        frame_seconds = time.perf_counter() - start
+        timings.setdefault("total", []).append(frame_seconds + decode_seconds)
+        frame_ms = round(1000 * (frame_seconds + decode_seconds), 3)
+        for _, track_id, fall_score, fall_detected in state.last_overlays:
+            track = state.tracker.tracks.get(track_id)
+            rows.append((clip, frames, round(frame_time, 3), track_id, round(fall_score, 4),
+                         track.fall_state.state if track else "", int(fall_detected), frame_ms))
+        if not state.last_overlays:
+            rows.append((clip, frames, round(frame_time, 3), "", "", "", 0, frame_ms))
+        frames += 1
+        if max_frames and frames >= max_frames:
+            break
+    seconds = time.perf_counter() - clip_start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return clip, rows, timings, frames, seconds, len(state.fall_events), peak_rss
+
+def run_clip_job(job):
+    return run_clip(*job)
+
+# =================================================================
+# Section 3: Output and Report
+# =================================================================
+def write_rows(path, rows):
+    if path.endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def print_report(results, wall, workers):
+    print(f"{'clip':<40}{'frames':>8}{'FPS':>8}{'falls':>7}")
+    timings = {}
+    frames = 0
+    busy = 0.0
+    for clip, _, clip_timings, clip_frames, seconds, falls, _ in results:
+        print(f"{os.path.basename(clip)[:39]:<40}{clip_frames:>8}{clip_frames / max(seconds, 1e-9):>8.1f}{falls:>7}")
+        for stage, values in clip_timings.items():
+            timings.setdefault(stage, []).extend(values)
+        frames += clip_frames
+        busy += seconds
+    print()
+    print(f"{'stage':<10}{'calls':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage in STAGES:
+        values = sorted(timings.get(stage, []))
+        if not values:
+            continue
+        print(f"{stage:<10}{len(values):>8}{1000 * sum(values) / len(values):>10.2f}"
+              f"{1000 * percentile(values, 0.5):>10.2f}{1000 * percentile(values, 0.95):>10.2f}"
+              f"{1000 * percentile(values, 0.99):>10.2f}")
+    peak_rss = max([r[6] for r in results] + [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss])
+    print()
+    print(f"{frames} frames in {wall:.1f}s with {workers} worker(s): {frames / max(wall, 1e-9):.1f} FPS overall, "
+          f"{frames / max(busy, 1e-9):.1f} FPS per worker")
+    print(f"peak RSS of one process: {peak_rss / 1024:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Video files, image directories or directories holding them")
+    parser.add_argument("--output", default="batch_scores.csv", help="Per-frame scores (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to spread clips over")
+    parser.add_argument("--image-fps", type=float, default=15.0, help="Frame rate assumed for image sequences")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop each clip after this many frames (0 = all)")
+    parser.add_argument("--no-gate", action="store_true", help="Run detection on every frame, even without motion")
+    args = parser.parse_args()
+
+    clips = find_clips(args.paths)
+    if not clips:
+        print("[ERROR] No videos or image sequences found")
+        sys.exit(1)
+    jobs = [(clip, args.image_fps, args.max_frames) for clip in clips]
+    start = time.perf_counter()
+    if args.workers > 1:
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.no_gate,)) as pool:
+            results = pool.map(run_clip_job, jobs, chunksize=1)
+    else:
+        init_worker(args.no_gate)
+        results = [run_clip_job(job) for job in jobs]
+    wall = time.perf_counter() - start
+
+    write_rows(args.output, [row for result in results for row in result[1]])
+    print_report(results, wall, args.workers)
+    print(f"per-frame scores written to {args.output}")
+
+if __name__ == '__main__':
+    main()
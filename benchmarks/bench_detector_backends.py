@@ -0,0 +1,150 @@
+"""
+Compares the detector backends (torch / onnx / openvino, optionally INT8) on
+a fixed image set: per-image latency and person-class mAP against YOLO-format
+labels (one "class cx cy w h" line per object, normalized, class 0 = person).
+
+    python benchmarks/bench_detector_backends.py --model yolov8n.pt \
+        --images data/val/images --labels data/val/labels \
+        --backends torch onnx openvino --int8 --imgsz 640 --threads 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detector_backends import DETECTOR_BACKENDS, load_detector
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+PERSON_CLASS = 0
+
+# =================================================================
+# Section 1: Dataset
+# =================================================================
+def load_dataset(images_dir, labels_dir):
+    """Returns [(name, image, person_boxes)] with person boxes as (N, 4) x1, y1, x2, y2 pixel arrays."""
+    dataset = []
+    for name in sorted(os.listdir(images_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        boxes = []
+        label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")
+        if os.path.exists(label_path):
+            with open(label_path) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 5 and int(float(parts[0])) == PERSON_CLASS:
+                        cx, cy, w, h = (float(v) for v in parts[1:5])
+                        boxes.append(((cx - w / 2) * width, (cy - h / 2) * height,
+                                      (cx + w / 2) * width, (cy + h / 2) * height))
+        dataset.append((name, image, np.array(boxes, dtype=np.float64).reshape(-1, 4)))
+    return dataset
+
+# =================================================================
+# Section 2: Person mAP
+# =================================================================
+def iou_matrix(a, b):
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def average_precision(predictions, ground_truth, iou_threshold):
+    """COCO-style 101-point AP. predictions: [(image_index, confidence, box)], ground_truth: [boxes per image]."""
+    total = sum(len(g) for g in ground_truth)
+    if total == 0:
+        return float("nan")
+    matched = [np.zeros(len(g), dtype=bool) for g in ground_truth]
+    ordered = sorted(predictions, key=lambda p: -p[1])
+    true_positive = np.zeros(len(ordered))
+    for rank, (image_index, _, box) in enumerate(ordered):
+        gt = ground_truth[image_index]
+        if len(gt) == 0:
+            continue
+        ious = iou_matrix(np.array([box], dtype=np.float64), gt)[0]
+        ious[matched[image_index]] = -1
+        best = int(ious.argmax())
+        if ious[best] >= iou_threshold:
+            matched[image_index][best] = True
+            true_positive[rank] = 1
+    tp = np.cumsum(true_positive)
+    recall = tp / total
+    precision = tp / np.arange(1, len(ordered) + 1)
+    # Precision envelope, sampled at 101 recall points
+    precision = np.maximum.accumulate(precision[::-1])[::-1] if len(precision) else precision
+    points = np.linspace(0, 1, 101)
+    indices = np.searchsorted(recall, points, side="left")
+    sampled = np.array([precision[i] if i < len(precision) else 0.0 for i in indices])
+    return float(sampled.mean())
+
+# =================================================================
+# Section 3: Driver
+# =================================================================
+def benchmark(detector, dataset, warmup):
+    for _, image, _ in dataset[:warmup]:
+        detector.detect(image)
+    latencies = []
+    predictions = []
+    for index, (_, image, _) in enumerate(dataset):
+        start = time.perf_counter()
+        detections = detector.detect(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions += [(index, conf, (x1, y1, x2, y2))
+                        for x1, y1, x2, y2, conf, cls in detections if cls == PERSON_CLASS]
+    ground_truth = [boxes for _, _, boxes in dataset]
+    ap50 = average_precision(predictions, ground_truth, 0.5)
+    ap50_95 = float(np.mean([average_precision(predictions, ground_truth, t) for t in np.arange(0.5, 0.96, 0.05)]))
+    return latencies, ap50, ap50_95
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="YOLO .pt model; exports are created next to it")
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--labels", help="YOLO-format label directory (default: ../labels next to --images)")
+    parser.add_argument("--backends", nargs="+", default=list(DETECTOR_BACKENDS), choices=DETECTOR_BACKENDS)
+    parser.add_argument("--int8", action="store_true", help="Also run the INT8 exports of onnx/openvino")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--conf", type=float, default=0.001, help="Low threshold so the mAP sees the full PR curve")
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    labels = args.labels or os.path.join(os.path.dirname(os.path.abspath(args.images)), "labels")
+    dataset = load_dataset(args.images, labels)
+    if not dataset:
+        print(f"[ERROR] No images found in {args.images}")
+        sys.exit(1)
+    print(f"{len(dataset)} images, {sum(len(b) for _, _, b in dataset)} labelled people, "
+          f"imgsz={args.imgsz}, threads={args.threads or 'default'}")
+
+    variants = [(backend, False) for backend in args.backends]
+    if args.int8:
+        variants += [(backend, True) for backend in args.backends if backend != "torch"]
+    print(f"{'backend':<16}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'AP50':>8}{'AP50-95':>9}")
+    for backend, int8 in variants:
+        name = f"{backend}{'-int8' if int8 else ''}"
+        try:
+            detector = load_detector(args.model, backend=backend, imgsz=args.imgsz, conf=args.conf,
+                                     threads=args.threads, int8=int8)
+        except Exception as e:
+            print(f"{name:<16}unavailable: {e}")
+            continue
+        latencies, ap50, ap50_95 = benchmark(detector, dataset, args.warmup)
+        latencies.sort()
+        print(f"{name:<16}{statistics.mean(latencies):>9.1f}{latencies[len(latencies) // 2]:>9.1f}"
+              f"{latencies[int(0.95 * (len(latencies) - 1))]:>9.1f}{ap50:>8.3f}{ap50_95:>9.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark: receive throughput of FrameReader vs the original
+`data += packet` loop from socket_server_thread, over a local socketpair.
+
+    python benchmarks/bench_frame_reader.py --frames 2000
+"""
+import argparse
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stream_protocol import FrameReader, pack_frame
+
+# =================================================================
+# Section 1: Receivers Under Test
+# =================================================================
+def legacy_receive(conn):
+    """The receive loop socket_server_thread used before FrameReader (4096-byte recv, bytes concatenation)."""
+    payload_size = struct.calcsize(">L")
+    data = b""
+    frames = 0
+    received = 0
+    while True:
+        while len(data) < payload_size:
+            packet = conn.recv(4096)
+            if not packet:
+                return frames, received
+            data += packet
+        packed_msg_size = data[:payload_size]
+        data = data[payload_size:]
+        msg_size = struct.unpack(">L", packed_msg_size)[0]
+        while len(data) < msg_size:
+            packet = conn.recv(4096)
+            if not packet:
+                return frames, received
+            data += packet
+        frame_data = data[:msg_size]
+        data = data[msg_size:]
+        frames += 1
+        received += len(frame_data)
+
+def frame_reader_receive(conn):
+    reader = FrameReader()
+    frames = 0
+    received = 0
+    while True:
+        frame = reader.next_frame()
+        if frame is None:
+            if reader.recv_from(conn) == 0:
+                return frames, received
+            continue
+        frames += 1
+        received += len(frame)
+
+# =================================================================
+# Section 2: Benchmark Driver
+# =================================================================
+def make_payloads(count, min_size, max_size, seed=0):
+    rng = random.Random(seed)
+    sizes = [rng.randint(min_size, max_size) for _ in range(16)]
+    blobs = [pack_frame(os.urandom(size)) for size in sizes]
+    return [blobs[i % len(blobs)] for i in range(count)]
+
+def run(receiver, payloads):
+    rx, tx = socket.socketpair()
+
+    def send_all():
+        for blob in payloads:
+            tx.sendall(blob)
+        tx.shutdown(socket.SHUT_WR)
+
+    sender = threading.Thread(target=send_all, daemon=True)
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    sender.start()
+    frames, received = receiver(rx)
+    cpu = time.thread_time() - start_cpu
+    wall = time.perf_counter() - start_wall
+    sender.join()
+    rx.close()
+    tx.close()
+    return frames, received, wall, cpu
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--min-size", type=int, default=50 * 1024)
+    parser.add_argument("--max-size", type=int, default=150 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.frames, args.min_size, args.max_size)
+    print(f"{'receiver':<14}{'frames':>8}{'MB/s':>10}{'frames/s':>10}{'rx CPU s':>10}")
+    for name, receiver in (("legacy", legacy_receive), ("FrameReader", frame_reader_receive)):
+        best = None
+        for _ in range(args.repeat):
+            result = run(receiver, payloads)
+            if best is None or result[2] < best[2]:
+                best = result
+        frames, received, wall, cpu = best
+        print(f"{name:<14}{frames:>8}{received / wall / 1e6:>10.1f}{frames / wall:>10.0f}{cpu:>10.3f}")
+
+if __name__ == '__main__':
+    main()
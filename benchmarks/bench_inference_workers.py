@@ -0,0 +1,172 @@
+"""
+Throughput benchmark of in-process detection against inference worker
+processes (INFERENCE_WORKERS in backend_server_1.py).
+
+For every worker count given, the backend runs as a child process; --cameras
+senders stream moving synthetic frames at --fps each, and once detection is
+ready the benchmark measures for --seconds
+
+    analysed    detection results published per second, over all cameras
+    latency     mean time from receiving a frame to publishing its detection result
+    received    frames received per second (ingest keeping up under load)
+    healthz     median response time of /healthz (how responsive Flask stays)
+
+    python benchmarks/bench_inference_workers.py --workers 0 1 2 4 --cameras 4
+
+Worker count 0 is the threaded pipeline inside the server process.
+"""
+import argparse
+import http.client
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+from stream_protocol import pack_frame, pack_hello
+
+POLL_INTERVAL = 0.05
+SAMPLE_LINE = re.compile(r'^(\w+)(?:\{camera="([^"]*)"\})? (\S+)$')
+
+RUNNER = """
+import sys
+sys.path.insert(0, {repo!r})
+import backend_server_1 as backend
+backend.SOCKET_PORT = {socket_port}
+backend.HTTP_PORT = {http_port}
+backend.INFERENCE_WORKERS = {workers}
+backend.main()
+"""
+
+def http_get(port, path):
+    """(status, body, seconds) of a GET, or None while the server does not answer."""
+    try:
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body, time.perf_counter() - start
+    except (OSError, http.client.HTTPException):
+        return None
+
+def scrape(port):
+    """{metric name: summed value} of the per-camera metrics the benchmark reads."""
+    result = http_get(port, "/metrics")
+    totals = {}
+    if result is None:
+        return totals
+    for line in result[1].decode().splitlines():
+        match = SAMPLE_LINE.match(line)
+        if match:
+            totals[match.group(1)] = totals.get(match.group(1), 0.0) + float(match.group(3))
+    return totals
+
+def make_frames(count=30, size=(480, 640)):
+    """JPEGs of a block moving across a noisy background, so the motion gate lets them through."""
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = i * (size[1] - 120) // count
+        cv2.rectangle(frame, (x, 100), (x + 120, 400), (255, 255, 255), -1)
+        frames.append(cv2.imencode(".jpg", frame)[1].tobytes())
+    return frames
+
+def send_camera(port, camera_id, frames, fps, stop):
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=1)
+            break
+        except OSError:
+            time.sleep(POLL_INTERVAL)
+    else:
+        return
+    sock.sendall(pack_hello(camera_id))
+    index = 0
+    next_send = time.perf_counter()
+    while not stop.is_set():
+        sock.sendall(pack_frame(frames[index % len(frames)]))
+        index += 1
+        next_send += 1.0 / fps
+        time.sleep(max(0.0, next_send - time.perf_counter()))
+    sock.close()
+
+def run_once(workers, args, frames):
+    code = RUNNER.format(repo=REPO_DIR, socket_port=args.socket_port, http_port=args.http_port, workers=workers)
+    child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stop = threading.Event()
+    senders = [threading.Thread(target=send_camera, args=(args.socket_port, f"cam{i}", frames, args.fps, stop),
+                                daemon=True) for i in range(args.cameras)]
+    for sender in senders:
+        sender.start()
+    try:
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            result = http_get(args.http_port, "/healthz")
+            if result is not None and result[0] == 200:
+                break
+            time.sleep(POLL_INTERVAL)
+        else:
+            return None
+        time.sleep(args.settle)
+        before = scrape(args.http_port)
+        start = time.perf_counter()
+        probes = []
+        while time.perf_counter() - start < args.seconds:
+            result = http_get(args.http_port, "/healthz")
+            if result is not None:
+                probes.append(result[2])
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        after = scrape(args.http_port)
+    finally:
+        stop.set()
+        for sender in senders:
+            sender.join(timeout=2)
+        child.terminate()
+        child.wait()
+
+    def delta(name):
+        return after.get(name, 0.0) - before.get(name, 0.0)
+    published = delta("fall_end_to_end_latency_seconds_count")
+    return {"analysed": published / elapsed,
+            "latency": 1000 * delta("fall_end_to_end_latency_seconds_sum") / published if published else float("nan"),
+            "received": delta("fall_frames_received_total") / elapsed,
+            "healthz": 1000 * statistics.median(probes) if probes else float("nan")}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2], help="Worker counts to compare")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--fps", type=float, default=15.0, help="Frames per second sent by each camera")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Length of each measurement")
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to run before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for detection to be ready")
+    parser.add_argument("--http-port", type=int, default=5078)
+    parser.add_argument("--socket-port", type=int, default=9978)
+    args = parser.parse_args()
+
+    frames = make_frames()
+    print(f"{args.cameras} cameras at {args.fps:g} FPS, {len(frames[0]) // 1024} KB frames")
+    print(f"{'workers':>8}{'analysed/s':>12}{'latency ms':>12}{'received/s':>12}{'healthz ms':>12}")
+    for workers in args.workers:
+        result = run_once(workers, args, frames)
+        if result is None:
+            print(f"{workers:>8}  detection did not become ready")
+            continue
+        print(f"{workers:>8}{result['analysed']:>12.1f}{result['latency']:>12.1f}"
+              f"{result['received']:>12.1f}{result['healthz']:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark and equivalence check of the NumPy landmark path (LandmarkWindow +
+compute_fall_scores) against the original per-landmark Python functions
+(smooth_landmarks_window + compute_fall_score).
+
+A synthetic random-walk pose sequence with random occlusions is fed to both
+paths for several people; every per-frame smoothed landmark and fall score
+must match, then the per-frame cost of each path is reported.
+
+    python benchmarks/bench_landmark_math.py --frames 2000 --people 3
+"""
+import argparse
+import os
+import sys
+import time
+import types
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import fall_detection_1 as fd
+
+def make_sequence(frames, people, seed=0):
+    """Returns (frames, people, 33, 3) x/y/visibility arrays following a random walk."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0.2, 0.8, size=(1, people, fd.NUM_LANDMARKS, 2))
+    steps = rng.normal(0.0, 0.01, size=(frames, people, fd.NUM_LANDMARKS, 2))
+    xy = start + np.cumsum(steps, axis=0)
+    visibility = rng.uniform(0.3, 1.0, size=(frames, people, fd.NUM_LANDMARKS, 1))
+    return np.concatenate([xy, visibility], axis=-1)
+
+def as_landmarks(array):
+    return [types.SimpleNamespace(x=x, y=y, visibility=v) for x, y, v in array]
+
+def run_reference(sequence):
+    frames, people = sequence.shape[:2]
+    histories = [{} for _ in range(people)]
+    smoothed = np.empty_like(sequence)
+    scores = np.empty((frames, people))
+    landmarks = [[as_landmarks(sequence[f, p]) for p in range(people)] for f in range(frames)]
+    start = time.perf_counter()
+    for f in range(frames):
+        for p in range(people):
+            result = fd.smooth_landmarks_window(landmarks[f][p], histories[p])
+            scores[f, p] = fd.compute_fall_score(result)
+            smoothed[f, p] = [(lm.x, lm.y, lm.visibility) for lm in result]
+    return smoothed, scores, time.perf_counter() - start
+
+def run_vectorized(sequence):
+    frames, people = sequence.shape[:2]
+    windows = [fd.LandmarkWindow() for _ in range(people)]
+    smoothed = np.empty_like(sequence)
+    scores = np.empty((frames, people))
+    start = time.perf_counter()
+    for f in range(frames):
+        for p in range(people):
+            smoothed[f, p] = windows[p].update(sequence[f, p])
+        scores[f] = fd.compute_fall_scores(smoothed[f])
+    return smoothed, scores, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--people", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sequence = make_sequence(args.frames, args.people, args.seed)
+    ref_smoothed, ref_scores, ref_time = run_reference(sequence)
+    vec_smoothed, vec_scores, vec_time = run_vectorized(sequence)
+
+    landmark_error = np.abs(ref_smoothed - vec_smoothed).max()
+    score_error = np.abs(ref_scores - vec_scores).max()
+    print(f"max |smoothed landmark diff| = {landmark_error:.3e}")
+    print(f"max |fall score diff|        = {score_error:.3e}")
+    if landmark_error > 1e-9 or score_error > 1e-9:
+        print("[ERROR] Vectorized results do not match the reference implementation")
+        sys.exit(1)
+
+    # Scoring a whole recording at once, e.g. for offline evaluation
+    start = time.perf_counter()
+    fd.compute_fall_scores(vec_smoothed)
+    batch_time = time.perf_counter() - start
+
+    per_frame = 1e6 / args.frames
+    print(f"reference  : {ref_time * per_frame:8.1f} us/frame ({args.people} people)")
+    print(f"vectorized : {vec_time * per_frame:8.1f} us/frame ({args.people} people)")
+    print(f"batch score: {batch_time * per_frame:8.2f} us/frame ({args.frames * args.people} poses in one call)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the pose stage on a recorded multi-person clip: the original
+serial loop (one shared MediaPipe Pose) vs estimate_poses() (one Pose per
+person, run on the pose thread pool). Latency is grouped by the number of
+people YOLO found in the frame, so the 1 -> 5 person trend is visible.
+
+    python benchmarks/bench_pose_batch.py --video clips/multi_person.mp4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import fall_detection_1 as fd
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True, help="Recorded clip with several people in view")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after this many frames (0 = whole clip)")
+    parser.add_argument("--max-people", type=int, default=5)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"[ERROR] Unable to open {args.video}")
+        sys.exit(1)
+
+    detector = fd.load_models()
+    shared_pose = fd.create_pose_estimator()
+    pooled_estimators = {}
+    serial_ms = defaultdict(list)
+    pooled_ms = defaultdict(list)
+    frames = 0
+    while not args.max_frames or frames < args.max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+        detections = detector.detect(frame)
+        crops = {}
+        for slot, (x1, y1, x2, y2) in enumerate(fd.extract_person_boxes(detections, detector.names)[:args.max_people]):
+            person_img = frame[y1:y2, x1:x2]
+            if person_img.size:
+                crops[slot] = cv2.cvtColor(person_img, cv2.COLOR_BGR2RGB)
+        if not crops:
+            continue
+
+        start = time.perf_counter()
+        for crop in crops.values():
+            shared_pose.process(crop)
+        serial_ms[len(crops)].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        fd.estimate_poses(crops, pooled_estimators)
+        pooled_ms[len(crops)].append((time.perf_counter() - start) * 1000)
+    cap.release()
+
+    print(f"{frames} frames, {fd.POSE_WORKERS} pose workers")
+    print(f"{'people':>6}{'frames':>8}{'serial mean':>13}{'serial p95':>12}{'pooled mean':>13}{'pooled p95':>12}")
+    for people in sorted(serial_ms):
+        serial, pooled = serial_ms[people], pooled_ms[people]
+        print(f"{people:>6}{len(serial):>8}{statistics.mean(serial):>11.1f}ms{percentile(serial, 95):>10.1f}ms"
+              f"{statistics.mean(pooled):>11.1f}ms{percentile(pooled, 95):>10.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Loopback stress test of the sender/backend wire protocol: sender_1's
+connection code streams to socket_server_thread of a backend_server_1.py
+child process, with model loading disabled so only ingest is measured.
+
+Throughput, for protocol v1 and v2 and every --sizes payload, sending as fast
+as the socket takes frames for --seconds:
+
+    sent/s      frames sent per second by the sender
+    received/s  frames the backend parsed per second
+    MB/s        payload throughput
+    header      bytes of framing per frame and their share of the payload
+
+Reconnect recovery (protocol v2), --reconnects times each:
+
+    drop        the sender's connection is reset (RST) mid-stream; time from
+                the reset to the first ack on the new connection
+    restart     the backend process is killed and started again; time from
+                the kill to the first ack from the new backend
+    lost        frames the backend counted as missing from the sequence
+                numbers after a drop (fall_frames_lost_total)
+
+    python benchmarks/bench_protocol.py --sizes 1024 16384 65536 --seconds 5
+"""
+import argparse
+import http.client
+import os
+import re
+import select
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+import sender_1
+from stream_protocol import FeedbackReader, encode_camera_id, pack_frame, pack_frame_v2
+
+POLL_INTERVAL = 0.02
+SAMPLE_LINE = re.compile(r'^(\w+)(?:\{camera="([^"]*)"\})? (\S+)$')
+
+RUNNER = """
+import sys
+sys.path.insert(0, {repo!r})
+import backend_server_1 as backend
+backend.SOCKET_PORT = {socket_port}
+backend.HTTP_PORT = {http_port}
+backend.model_loader_thread = lambda: None
+backend.main()
+"""
+
+def metrics(port, camera_id):
+    """{metric name: value} of the camera's samples on /metrics, or None while the server does not answer."""
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+        conn.request("GET", "/metrics")
+        body = conn.getresponse().read().decode()
+        conn.close()
+    except (OSError, http.client.HTTPException):
+        return None
+    values = {}
+    for line in body.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if match and match.group(2) == camera_id:
+            values[match.group(1)] = float(match.group(3))
+    return values
+
+def start_backend(args):
+    code = RUNNER.format(repo=REPO_DIR, socket_port=args.socket_port, http_port=args.http_port)
+    child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        if metrics(args.http_port, "") is not None:
+            return child
+        time.sleep(POLL_INTERVAL)
+    child.kill()
+    raise RuntimeError("backend did not start")
+
+def connect(version, camera_id, link):
+    """A sender_1 connection as camera_id speaking the given protocol version."""
+    sender_1.WIRE_PROTOCOL = version
+    sender_1.CAMERA_ID = camera_id
+    sock, last_seq = sender_1.connect_to_server()
+    link.connected(last_seq)
+    return sock
+
+def wait_for_first_ack(sock, link, payload, timeout):
+    """Streams frames until the backend acks one; returns the time the ack arrived."""
+    reader = FeedbackReader()
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        link.send_frame(sock, payload, time.time())
+        readable, _, _ = select.select([sock], [], [], 0.001)
+        if readable:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            reader.feed(data)
+            if reader.take_acks():
+                return time.perf_counter()
+    raise TimeoutError("no ack")
+
+def reset(sock):
+    """Closes the socket with an RST, like a dropped link, instead of an orderly FIN."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    sock.close()
+
+def throughput(version, size, args, run):
+    camera_id = f"bench-v{version}-{size}-{run}"
+    link = sender_1.FrameLink(camera_id)
+    controller = sender_1.AdaptiveController()
+    reader = FeedbackReader()
+    payload = bytes(size)
+    sock = connect(version, camera_id, link)
+    before = metrics(args.http_port, camera_id) or {}
+    sent = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        link.send_frame(sock, payload, time.time())
+        sent += 1
+        if sent % 64 == 0:
+            link.keep_alive(sock, reader, controller)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)   # let the backend drain its receive buffer
+    after = metrics(args.http_port, camera_id) or {}
+    sock.close()
+    received = after.get("fall_frames_received_total", 0.0) - before.get("fall_frames_received_total", 0.0)
+    return sent / elapsed, received / elapsed, sent * size / elapsed / 1e6
+
+def header_bytes(version, camera_id):
+    if version >= 2:
+        return len(pack_frame_v2(encode_camera_id(camera_id), 0, 0.0, b""))
+    return len(pack_frame(b""))
+
+def recover_from_drop(args, payload):
+    camera_id = "bench-drop"
+    link = sender_1.FrameLink(camera_id)
+    sock = connect(2, camera_id, link)
+    wait_for_first_ack(sock, link, payload, args.timeout)
+    results = []
+    for _ in range(args.reconnects):
+        # Keep the pipe full so frames are in flight when the link drops
+        stream_until = time.perf_counter() + 0.2
+        while time.perf_counter() < stream_until:
+            link.send_frame(sock, payload, time.time())
+        before = metrics(args.http_port, camera_id) or {}
+        dropped = time.perf_counter()
+        reset(sock)
+        sock = connect(2, camera_id, link)
+        acked = wait_for_first_ack(sock, link, payload, args.timeout)
+        time.sleep(0.2)
+        after = metrics(args.http_port, camera_id) or {}
+        lost = after.get("fall_frames_lost_total", 0.0) - before.get("fall_frames_lost_total", 0.0)
+        results.append((acked - dropped, lost))
+    sock.close()
+    return results
+
+def recover_from_restart(child, args, payload):
+    camera_id = "bench-restart"
+    link = sender_1.FrameLink(camera_id)
+    sock = connect(2, camera_id, link)
+    wait_for_first_ack(sock, link, payload, args.timeout)
+    results = []
+    for _ in range(args.reconnects):
+        killed = time.perf_counter()
+        child.kill()
+        child.wait()
+        child = subprocess.Popen(child.args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while True:
+            # The sender notices the dead connection on its next send or read, like sender_1.main
+            try:
+                acked = wait_for_first_ack(sock, link, payload, args.timeout)
+                break
+            except (socket.error, ConnectionError):
+                sock.close()
+                sock = connect(2, camera_id, link)
+        results.append(acked - killed)
+    sock.close()
+    return child, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 16384, 65536], help="Payload sizes in bytes")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of each throughput run")
+    parser.add_argument("--reconnects", type=int, default=5, help="Drops and restarts to measure")
+    parser.add_argument("--retry-delay", type=float, default=0.05,
+                        help="Sender reconnect delay (sender_1.RECONNECT_DELAY) during the test")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for the backend")
+    parser.add_argument("--http-port", type=int, default=5077)
+    parser.add_argument("--socket-port", type=int, default=9977)
+    args = parser.parse_args()
+
+    sender_1.SERVER_IP = "127.0.0.1"
+    sender_1.SERVER_PORT = args.socket_port
+    sender_1.RECONNECT_DELAY = args.retry_delay
+    sys.stdout = open(os.devnull, "w")   # sender_1 logs every connect
+    report = sys.__stdout__
+
+    child = start_backend(args)
+    try:
+        print(f"{'protocol':>8}{'payload':>9}{'sent/s':>10}{'received/s':>12}{'MB/s':>9}{'header':>14}", file=report)
+        for size in args.sizes:
+            for run, version in enumerate((1, 2)):
+                sent, received, mbps = throughput(version, size, args, run)
+                header = header_bytes(version, f"bench-v{version}-{size}-{run}")
+                print(f"{'v' + str(version):>8}{size:>9}{sent:>10.0f}{received:>12.0f}{mbps:>9.1f}"
+                      f"{header:>6} B {100 * header / size:>5.2f}%", file=report)
+
+        payload = bytes(args.sizes[0])
+        drops = recover_from_drop(args, payload)
+        child, restarts = recover_from_restart(child, args, payload)
+        print(f"\nreconnect recovery over {args.reconnects} runs (median / max ms)", file=report)
+        drop_times = [seconds for seconds, _ in drops]
+        print(f"  drop     {1000 * statistics.median(drop_times):8.1f} {1000 * max(drop_times):8.1f}"
+              f"   lost frames per drop: {statistics.mean(lost for _, lost in drops):.1f}", file=report)
+        print(f"  restart  {1000 * statistics.median(restarts):8.1f} {1000 * max(restarts):8.1f}", file=report)
+    finally:
+        child.terminate()
+        child.wait()
+
+if __name__ == '__main__':
+    main()
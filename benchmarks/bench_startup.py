@@ -0,0 +1,151 @@
+"""
+Startup-time benchmark of backend_server_1.py: starts the server as a child
+process and measures, from process start, when
+
+    http      the Flask server answers /healthz
+    socket    the sender port accepts a connection
+    video     a viewer of /video_feed/<camera> gets its first frame
+    ready     /healthz reports fall detection ready (models loaded and warmed up)
+
+--eager also measures the old behaviour, where the models were loaded before
+anything else started, by loading them in the child before calling main().
+
+    python benchmarks/bench_startup.py --runs 3 --eager
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+from stream_protocol import pack_frame, pack_hello
+
+CAMERA_ID = "startup-bench"
+POLL_INTERVAL = 0.02
+
+RUNNER = """
+import sys
+sys.path.insert(0, {repo!r})
+if {eager!r}:
+    import fall_detection_1
+    fall_detection_1.warm_up()
+import backend_server_1 as backend
+backend.SOCKET_PORT = {socket_port}
+backend.HTTP_PORT = {http_port}
+backend.main()
+"""
+
+def healthz(port):
+    """(HTTP status, body) of /healthz, or None while the server does not answer."""
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        conn.request("GET", "/healthz")
+        response = conn.getresponse()
+        body = json.loads(response.read())
+        conn.close()
+        return response.status, body
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+
+def stream_frames(port, stop):
+    """Connects as a sender as soon as the port accepts and sends a frame every 50 ms."""
+    jpeg = cv2.imencode(".jpg", np.full((240, 320, 3), 128, np.uint8))[1].tobytes()
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=1)
+            break
+        except OSError:
+            time.sleep(POLL_INTERVAL)
+    else:
+        return None
+    connected = time.perf_counter()
+    sock.sendall(pack_hello(CAMERA_ID))
+    while not stop.is_set():
+        sock.sendall(pack_frame(jpeg))
+        time.sleep(0.05)
+    sock.close()
+    return connected
+
+def first_video_frame(port, deadline):
+    """Time the first MJPEG chunk arrives on the camera's video feed."""
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", f"/video_feed/{CAMERA_ID}")
+            response = conn.getresponse()
+            if response.status == 200 and response.read1(4096):
+                conn.close()
+                return time.perf_counter()
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(POLL_INTERVAL)
+    return None
+
+def run_once(eager, http_port, socket_port, timeout):
+    code = RUNNER.format(repo=REPO_DIR, eager=eager, socket_port=socket_port, http_port=http_port)
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = start + timeout
+    stop = threading.Event()
+    result = {}
+    sender = threading.Thread(target=lambda: result.setdefault("socket", stream_frames(socket_port, stop)), daemon=True)
+    sender.start()
+    times = {"http": None, "video": None, "ready": None}
+    status = None
+    try:
+        while time.perf_counter() < deadline:
+            status = healthz(http_port)
+            if status is not None:
+                times["http"] = time.perf_counter()
+                break
+            time.sleep(POLL_INTERVAL)
+        times["video"] = first_video_frame(http_port, deadline)
+        while time.perf_counter() < deadline:
+            status = healthz(http_port)
+            if status is not None and (status[0] == 200 or status[1].get("detector") == "failed"):
+                if status[0] == 200:
+                    times["ready"] = time.perf_counter()
+                break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        stop.set()
+        sender.join(timeout=2)
+        child.terminate()
+        child.wait()
+    times["socket"] = result.get("socket")
+    elapsed = {name: (t - start if t else None) for name, t in times.items()}
+    return elapsed, status[1] if status else {}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--eager", action="store_true", help="Also measure loading the models before startup")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for each milestone")
+    parser.add_argument("--http-port", type=int, default=5079)
+    parser.add_argument("--socket-port", type=int, default=9979)
+    args = parser.parse_args()
+
+    modes = [("lazy", False)] + ([("eager", True)] if args.eager else [])
+    print(f"{'mode':<7}{'run':>4}{'http s':>9}{'socket s':>10}{'video s':>9}{'ready s':>9}  detector")
+    for name, eager in modes:
+        for run in range(args.runs):
+            elapsed, health = run_once(eager, args.http_port, args.socket_port, args.timeout)
+            cells = "".join(f"{elapsed[key]:>{width}.2f}" if elapsed[key] is not None else f"{'-':>{width}}"
+                            for key, width in (("http", 9), ("socket", 10), ("video", 9), ("ready", 9)))
+            detector = health.get("detector", "?")
+            if health.get("error"):
+                detector += f" ({health['error']})"
+            print(f"{name:<7}{run + 1:>4}{cells}  {detector}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Offline evaluation of fall event detection on labelled clips.
+
+Replays per-person fall score traces through the fall state machine
+(fall_state.py) and through the old single-frame rule (score >= threshold
+raises an alarm at once) and reports precision, recall and detection latency
+of both against the labelled falls.
+
+Clips can be
+    *.json   sidecars written by event_recorder.py (scores are replayed directly)
+    videos   any file OpenCV reads; fall_detection is run on every frame with the
+             video's own timestamps (needs the YOLO model and MediaPipe)
+
+The labels file maps a clip's file name to its falls, in seconds from the
+start of the clip:
+
+    {"kitchen.mp4": [[3.2, 9.0]], "hall.json": [{"start": 1.5, "end": 6.0}], "empty.mp4": []}
+
+Saved traces (--save-traces) keep the name of the video they came from, so
+they find the video's labels; otherwise a clip is also looked up by its name
+without extension. Clips missing from the labels count as containing no fall.
+A detection is correct when it is confirmed between a fall's start -
+--tolerance and its end + --tolerance; only the first detection per fall
+counts, repeated alarms for the same fall are false positives. Latency is
+confirmation time minus the labelled start.
+
+    python benchmarks/eval_fall_events.py --labels labels.json clips/*.mp4 clips/*.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import fall_state
+from fall_state import FallEvent, FallStateMachine
+
+VIDEO_FALLBACK_FPS = 30.0
+
+# =================================================================
+# Section 1: Score Traces
+# =================================================================
+def trace_from_sidecar(path):
+    """
+    [(t, {person: score})] from an event_recorder.py sidecar or a saved trace,
+    t relative to the clip's first frame, and the name of the clip it came from.
+    """
+    with open(path) as f:
+        sidecar = json.load(f)
+    scores = sidecar.get("scores", [])
+    frames = sidecar.get("frames", [])
+    start = frames[0]["t"] if frames else (scores[0]["t"] if scores else 0.0)
+    return [(entry["t"] - start, entry["scores"]) for entry in scores], sidecar.get("source")
+
+def trace_from_video(path):
+    """
+    Runs fall_detection on every frame and returns [(t, {person: score})] in
+    video time. Frames the motion gate skipped only repeat the last scores and
+    are left out.
+    """
+    import cv2
+    import fall_detection_1 as fd
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise OSError(f"cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or VIDEO_FALLBACK_FPS
+    state = fd.DetectionState()
+    trace = []
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        now = index / fps
+        analysed = state.motion_gate.frames_analysed
+        fd.process_frame(frame, state, now=now, annotate=False)
+        if state.motion_gate.frames_analysed > analysed:
+            trace.append((now, {track_id: score for _, track_id, score, _ in state.last_overlays}))
+        index += 1
+    cap.release()
+    return trace
+
+def load_trace(path):
+    """(trace, name the clip's labels are filed under)."""
+    if path.endswith(".json"):
+        trace, source = trace_from_sidecar(path)
+        return trace, source or os.path.basename(path)
+    return trace_from_video(path), os.path.basename(path)
+
+# =================================================================
+# Section 2: Replaying Detectors
+# =================================================================
+def replay_state_machine(trace, **params):
+    """Confirmed fall events of the fall state machine over a trace."""
+    machines = {}
+    events = []
+    for t, scores in trace:
+        for person, score in scores.items():
+            machine = machines.setdefault(person, FallStateMachine(person, **params))
+            event = machine.update(t, score)
+            if event is not None and event.end is None:
+                events.append(event)
+    end_time = trace[-1][0] if trace else 0.0
+    for machine in machines.values():
+        machine.close(end_time)
+    return events
+
+def replay_single_frame(trace, threshold):
+    """The old rule: every frame a person's score crosses threshold upwards raises an alarm."""
+    above = {}
+    events = []
+    for t, scores in trace:
+        for person, score in scores.items():
+            if score >= threshold and not above.get(person, False):
+                events.append(FallEvent(person, t, t, score))
+            above[person] = score >= threshold
+    return events
+
+# =================================================================
+# Section 3: Scoring
+# =================================================================
+def find_falls(labels, name):
+    """The labelled falls of a clip, by exact name or else by the name without extension."""
+    if name in labels:
+        return labels[name]
+    stem = os.path.splitext(name)[0]
+    for key, falls in labels.items():
+        if os.path.splitext(key)[0] == stem:
+            return falls
+    return []
+
+def parse_labels(raw):
+    return [(item["start"], item["end"]) if isinstance(item, dict) else (item[0], item[1]) for item in raw]
+
+def match_events(events, falls, tolerance):
+    """Returns (true positives, false positives, false negatives, latencies)."""
+    matched = [False] * len(falls)
+    latencies = []
+    false_positives = 0
+    for event in sorted(events, key=lambda e: e.confirmed_at):
+        for index, (start, end) in enumerate(falls):
+            if not matched[index] and start - tolerance <= event.confirmed_at <= end + tolerance:
+                matched[index] = True
+                latencies.append(event.confirmed_at - start)
+                break
+        else:
+            false_positives += 1
+    true_positives = sum(matched)
+    return true_positives, false_positives, len(falls) - true_positives, latencies
+
+def summarize(name, totals):
+    tp, fp, fn, latencies = totals
+    precision = tp / (tp + fp) if tp + fp else float("nan")
+    recall = tp / (tp + fn) if tp + fn else float("nan")
+    mean_latency = statistics.mean(latencies) if latencies else float("nan")
+    median_latency = statistics.median(latencies) if latencies else float("nan")
+    print(f"{name:<14}{tp:>5}{fp:>5}{fn:>5}{precision:>11.3f}{recall:>8.3f}"
+          f"{mean_latency:>11.2f}{median_latency:>11.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="+", help="Sidecar .json files or video files")
+    parser.add_argument("--labels", required=True, help="JSON file of labelled fall intervals per clip")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Seconds of slack around a labelled fall")
+    parser.add_argument("--enter", type=float, default=fall_state.FALL_ENTER_THRESHOLD)
+    parser.add_argument("--exit", type=float, default=fall_state.FALL_EXIT_THRESHOLD)
+    parser.add_argument("--velocity", type=float, default=fall_state.FALL_VELOCITY_THRESHOLD)
+    parser.add_argument("--dwell", type=float, default=fall_state.FALL_MIN_DWELL)
+    parser.add_argument("--recover", type=float, default=fall_state.RECOVER_MIN_DWELL)
+    parser.add_argument("--save-traces", metavar="DIR",
+                        help="Write the score trace of every video here as a sidecar-style .json for quick re-runs")
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        labels = {name: parse_labels(falls) for name, falls in json.load(f).items()}
+    params = dict(enter_threshold=args.enter, exit_threshold=args.exit, velocity_threshold=args.velocity,
+                  min_dwell=args.dwell, recover_dwell=args.recover)
+
+    totals = {"single-frame": [0, 0, 0, []], "state machine": [0, 0, 0, []]}
+    print(f"{'clip':<30}{'falls':>6}{'single-frame':>14}{'state machine':>15}")
+    for path in args.clips:
+        trace, name = load_trace(path)
+        if args.save_traces and not path.endswith(".json"):
+            os.makedirs(args.save_traces, exist_ok=True)
+            with open(os.path.join(args.save_traces, name + ".json"), "w") as f:
+                json.dump({"source": name, "scores": [{"t": t, "scores": scores} for t, scores in trace]}, f)
+        falls = find_falls(labels, name)
+        detections = {"single-frame": replay_single_frame(trace, args.enter),
+                      "state machine": replay_state_machine(trace, **params)}
+        counts = []
+        for detector, events in detections.items():
+            tp, fp, fn, latencies = match_events(events, falls, args.tolerance)
+            total = totals[detector]
+            total[0] += tp
+            total[1] += fp
+            total[2] += fn
+            total[3] += latencies
+            counts.append(f"{tp}/{len(events)}")
+        # Per clip: correct detections / all detections
+        print(f"{name[:29]:<30}{len(falls):>6}{counts[0]:>14}{counts[1]:>15}")
+
+    print()
+    print(f"{'detector':<14}{'TP':>5}{'FP':>5}{'FN':>5}{'precision':>11}{'recall':>8}"
+          f"{'latency s':>11}{'median s':>11}")
+    for detector, total in totals.items():
+        summarize(detector, total)
+
+if __name__ == '__main__':
+    main()
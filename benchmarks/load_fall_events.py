@@ -0,0 +1,167 @@
+"""
+Load test of fall status delivery to dashboards: runs the backend's Flask app
+in this process, toggles one camera's fall state on a fixed schedule and
+attaches hundreds of dashboards from a separate client process.
+
+Two kinds of dashboard are compared:
+
+    sse       one /fall_events connection each, as the index page does now
+    polling   GET /fall_status/<camera> every second, as the page did before
+
+For each dashboard count it reports the server process CPU use, HTTP
+requests per second and how long after a state change the dashboards saw it.
+
+    python benchmarks/load_fall_events.py --dashboards 100 300 500 --duration 20
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import backend_server_1 as backend
+
+CAMERA_ID = "bench"
+POLL_INTERVAL = 1.0
+
+# =================================================================
+# Section 1: Server Side (this process)
+# =================================================================
+def toggler(camera, start_at, period, stop, counter):
+    """Flips the camera between one fallen person and nobody fallen at start_at + k * period."""
+    k = 0
+    while not stop.wait(max(0.0, start_at + k * period - time.time())):
+        fallen = k % 2 == 0
+        backend.update_fall_status(camera, fallen, [((0, 0, 100, 200), 1, 0.8 if fallen else 0.1, fallen)])
+        counter[0] += 1
+        k += 1
+
+# =================================================================
+# Section 2: Client Side (separate process, one thread per dashboard)
+# =================================================================
+def change_latency(seen_at, start_at, period):
+    """Seconds since the most recent scheduled state change."""
+    return (seen_at - start_at) % period
+
+def sse_dashboard(port, deadline, start_at, period, results, index):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", f"/fall_events/{CAMERA_ID}")
+    response = conn.getresponse()
+    latencies = []
+    buffer = b""
+    while time.time() < deadline:
+        data = response.read1(4096)
+        if not data:
+            break
+        buffer += data
+        while b"\n\n" in buffer:
+            message, buffer = buffer.split(b"\n\n", 1)
+            if b"data: " in message:
+                latencies.append(change_latency(time.time(), start_at, period))
+    conn.close()
+    results[index] = (latencies, 1)
+
+def polling_dashboard(port, deadline, start_at, period, results, index):
+    latencies = []
+    requests = 0
+    status = None
+    next_poll = start_at + POLL_INTERVAL * index / max(1, len(results))   # spread like real browsers
+    while True:
+        time.sleep(max(0.0, next_poll - time.time()))
+        if time.time() >= deadline:
+            break
+        next_poll += POLL_INTERVAL
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", f"/fall_status/{CAMERA_ID}")
+        new_status = json.loads(conn.getresponse().read())["status"]
+        conn.close()
+        requests += 1
+        if status is not None and new_status != status:
+            latencies.append(change_latency(time.time(), start_at, period))
+        status = new_status
+    results[index] = (latencies, requests)
+
+def client_process(port, mode, dashboards, deadline, start_at, period, queue):
+    target = sse_dashboard if mode == "sse" else polling_dashboard
+    results = [None] * dashboards
+    threads = [threading.Thread(target=target, args=(port, deadline, start_at, period, results, i), daemon=True)
+               for i in range(dashboards)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put([r for r in results if r is not None])
+
+# =================================================================
+# Section 3: Driver
+# =================================================================
+def server_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run_case(port, mode, dashboards, duration, period, camera):
+    queue = multiprocessing.Queue()
+    start_at = time.time() + 3.0   # give every dashboard time to connect first
+    deadline = start_at + duration
+    clients = multiprocessing.Process(target=client_process,
+                                      args=(port, mode, dashboards, deadline, start_at, period, queue))
+    clients.start()
+    time.sleep(max(0.0, start_at - time.time()))
+    stop = threading.Event()
+    counter = [0]
+    toggle = threading.Thread(target=toggler, args=(camera, start_at, period, stop, counter), daemon=True)
+    cpu_start = server_cpu_seconds()
+    toggle.start()
+    results = queue.get()
+    cpu = server_cpu_seconds() - cpu_start
+    stop.set()
+    toggle.join()
+    clients.join()
+    time.sleep(0.5)   # let the server notice the closed dashboards
+    latencies = [latency for dashboard_latencies, _ in results for latency in dashboard_latencies]
+    requests = sum(r for _, r in results)
+    return counter[0], len(results), latencies, requests, cpu
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dashboards", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--period", type=float, default=2.5, help="Seconds between fall state changes")
+    parser.add_argument("--modes", nargs="+", default=["sse", "polling"], choices=["sse", "polling"])
+    parser.add_argument("--port", type=int, default=5078)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)   # no access log line per poll
+    camera = backend.get_camera(CAMERA_ID, create=True)
+    server = make_server("127.0.0.1", args.port, backend.app, threaded=True)
+    server.socket.listen(1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{'mode':<9}{'dashboards':>11}{'changes':>8}{'seen':>7}{'req/s':>8}"
+          f"{'p50 ms':>8}{'p99 ms':>8}{'CPU %':>8}")
+    for mode in args.modes:
+        for dashboards in args.dashboards:
+            changes, finished, latencies, requests, cpu = run_case(args.port, mode, dashboards, args.duration,
+                                                                   args.period, camera)
+            # "seen" is the average number of changes each dashboard noticed
+            print(f"{mode:<9}{dashboards:>11}{changes:>8}{len(latencies) / max(1, finished):>7.1f}"
+                  f"{requests / args.duration:>8.1f}{1000 * percentile(latencies, 0.5):>8.0f}"
+                  f"{1000 * percentile(latencies, 0.99):>8.0f}{100 * cpu / args.duration:>7.1f}%")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
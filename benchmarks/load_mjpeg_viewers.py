@@ -0,0 +1,162 @@
+"""
+Load test of the MJPEG fan-out: runs the backend's Flask app in this process,
+publishes synthetic JPEG frames for one camera at a fixed rate and attaches
+1, 10 and 50 concurrent viewers from a separate client process.
+
+For each viewer count it reports the server process CPU time and how many
+frames each viewer received compared to how many were published. The old
+polling generator (every viewer wakes every 30 ms and re-sends whatever is
+in the slot) is measured too with --legacy.
+
+    python benchmarks/load_mjpeg_viewers.py --viewers 1 10 50 --duration 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from flask import Response
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import backend_server_1 as backend
+
+CAMERA_ID = "bench"
+BOUNDARY = b"--frame\r\n"
+
+# =================================================================
+# Section 1: Server Side (this process)
+# =================================================================
+def legacy_generate_frames(camera):
+    """The per-viewer polling generator used before FrameBroadcaster."""
+    while True:
+        with camera.frame_lock:
+            frame_to_send = camera.latest_frame_jpeg
+        if frame_to_send is None:
+            time.sleep(0.1)
+            continue
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame_to_send + b'\r\n')
+        time.sleep(0.03)
+
+@backend.app.route('/bench_legacy_feed/<camera_id>')
+def bench_legacy_feed(camera_id):
+    return Response(legacy_generate_frames(backend.get_camera(camera_id)),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def publisher(camera, fps, stop, counter):
+    frames = []
+    for i in range(8):
+        image = np.full((480, 640, 3), i * 30, np.uint8)
+        cv2.putText(image, str(i), (300, 240), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5)
+        frames.append(cv2.imencode('.jpg', image)[1].tobytes())
+    interval = 1.0 / fps
+    next_time = time.perf_counter()
+    while not stop.is_set():
+        jpeg = frames[counter[0] % len(frames)]
+        with camera.frame_lock:
+            camera.latest_frame_jpeg = jpeg
+            camera.frame_seq += 1
+        camera.broadcaster.publish(jpeg)
+        counter[0] += 1
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+# =================================================================
+# Section 2: Client Side (separate process, one thread per viewer)
+# =================================================================
+def viewer(port, path, duration, results, index):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    frames = 0
+    received = 0
+    tail = b""
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        data = response.read1(65536)
+        if not data:
+            break
+        received += len(data)
+        chunk = tail + data
+        frames += chunk.count(BOUNDARY)
+        tail = chunk[-(len(BOUNDARY) - 1):]
+    conn.close()
+    results[index] = (frames, received)
+
+def client_process(port, path, viewers, duration, queue):
+    results = [None] * viewers
+    threads = [threading.Thread(target=viewer, args=(port, path, duration, results, i)) for i in range(viewers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put([r for r in results if r is not None])
+
+# =================================================================
+# Section 3: Driver
+# =================================================================
+def server_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def run_case(port, path, viewers, duration, camera, fps):
+    stop = threading.Event()
+    counter = [0]
+    pub = threading.Thread(target=publisher, args=(camera, fps, stop, counter), daemon=True)
+    pub.start()
+    time.sleep(0.2)
+    queue = multiprocessing.Queue()
+    clients = multiprocessing.Process(target=client_process, args=(port, path, viewers, duration, queue))
+    cpu_start = server_cpu_seconds()
+    published_start = counter[0]
+    wall_start = time.perf_counter()
+    clients.start()
+    results = queue.get()
+    clients.join()
+    wall = time.perf_counter() - wall_start
+    cpu = server_cpu_seconds() - cpu_start
+    published = counter[0] - published_start
+    stop.set()
+    pub.join()
+    time.sleep(0.5)   # let the server notice the closed viewers
+    frames = [f for f, _ in results]
+    mbytes = sum(b for _, b in results) / 1e6
+    return published, frames, mbytes, cpu, wall
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--fps", type=float, default=15.0, help="Rate at which new frames are published")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--legacy", action="store_true", help="Also measure the old polling generator")
+    args = parser.parse_args()
+
+    camera = backend.get_camera(CAMERA_ID, create=True)
+    server = make_server("127.0.0.1", args.port, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    modes = [("broadcast", f"/video_feed/{CAMERA_ID}")]
+    if args.legacy:
+        modes.append(("legacy", f"/bench_legacy_feed/{CAMERA_ID}"))
+    print(f"{'mode':<10}{'viewers':>8}{'published':>10}{'min rx':>8}{'mean rx':>9}"
+          f"{'dup/skip':>10}{'MB sent':>9}{'CPU %':>8}")
+    for name, path in modes:
+        for viewers in args.viewers:
+            published, frames, mbytes, cpu, wall = run_case(args.port, path, viewers, args.duration, camera, args.fps)
+            mean_rx = sum(frames) / max(1, len(frames))
+            # >1: viewers got the same frame repeatedly, <1: they skipped frames
+            ratio = mean_rx / max(1, published)
+            print(f"{name:<10}{viewers:>8}{published:>10}{min(frames, default=0):>8}{mean_rx:>9.1f}"
+                  f"{ratio:>10.2f}{mbytes:>9.1f}{100 * cpu / wall:>7.1f}%")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
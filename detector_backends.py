@@ -0,0 +1,198 @@
+"""
+Person/object detector backends for fall_detection.py.
+
+Every backend turns a BGR frame into a list of detections
+    (x1, y1, x2, y2, confidence, class_id)
+in frame pixel coordinates, so the rest of the pipeline does not care which
+runtime produced them:
+
+    "torch"     the .pt model through ultralytics (the original setup)
+    "onnx"      the model exported to ONNX, run by ONNX Runtime
+    "openvino"  the model exported to OpenVINO IR, run by OpenVINO
+
+Exported models are created next to the .pt file on first use. onnxruntime and
+openvino are optional and only imported when their backend is selected.
+"""
+import ast
+import os
+
+import cv2
+import numpy as np
+
+DETECTOR_BACKENDS = ("torch", "onnx", "openvino")
+NMS_IOU_THRESHOLD = 0.7      # Same default as ultralytics
+LETTERBOX_COLOR = (114, 114, 114)
+
+# =================================================================
+# Section 1: Model Export
+# =================================================================
+def exported_model_path(model_path, backend, imgsz, int8=False):
+    """Where the exported copy of model_path lives. Exports have a fixed input size, so it is part of the name."""
+    stem = f"{os.path.splitext(model_path)[0]}_{imgsz}"
+    if backend == "onnx":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return model_path
+
+def export_model(model_path, backend, imgsz, int8=False):
+    """Exports model_path for backend unless that was already done. Returns the exported path."""
+    target = exported_model_path(model_path, backend, imgsz, int8)
+    if backend == "torch" or os.path.exists(target):
+        return target
+    from ultralytics import YOLO
+
+    print(f"[INFO] Exporting {model_path} to {backend}{' (INT8)' if int8 else ''} at {imgsz}px ...")
+    if backend == "openvino":
+        # OpenVINO INT8 uses post-training quantization with ultralytics' calibration set
+        exported = YOLO(model_path).export(format="openvino", imgsz=imgsz, int8=int8)
+        if os.path.abspath(exported) != os.path.abspath(target):
+            os.replace(exported, target)
+        return target
+
+    onnx_path = exported_model_path(model_path, "onnx", imgsz)
+    if not os.path.exists(onnx_path):
+        exported = YOLO(model_path).export(format="onnx", imgsz=imgsz)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+    if int8:
+        # No calibration data is needed for dynamic quantization of the weights
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+    return target
+
+# =================================================================
+# Section 2: Backends
+# =================================================================
+class TorchDetector:
+    """The .pt model through ultralytics."""
+    def __init__(self, model_path, imgsz, conf, threads):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        self.imgsz = imgsz
+        self.conf = conf
+
+    def detect(self, frame):
+        result = self.model.predict(source=frame, device='cpu', imgsz=self.imgsz, conf=self.conf, verbose=False)[0]
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        confidences = boxes.conf.cpu().numpy()
+        classes = boxes.cls.cpu().numpy()
+        return [(int(b[0]), int(b[1]), int(b[2]), int(b[3]), float(c), int(k))
+                for b, c, k in zip(xyxy, confidences, classes)]
+
+class ExportedYoloDetector:
+    """Letterbox pre-processing and YOLOv8 output decoding shared by the exported-model backends."""
+    def __init__(self, imgsz, conf):
+        self.imgsz = imgsz
+        self.conf = conf
+        self.names = {0: "person"}
+
+    def detect(self, frame):
+        blob, scale, pad_x, pad_y = self._preprocess(frame)
+        output = self._infer(blob)
+        return self._postprocess(output, scale, pad_x, pad_y, frame.shape)
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def _preprocess(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(self.imgsz / height, self.imgsz / width)
+        new_w, new_h = int(round(width * scale)), int(round(height * scale))
+        pad_x, pad_y = (self.imgsz - new_w) // 2, (self.imgsz - new_h) // 2
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        padded = cv2.copyMakeBorder(resized, pad_y, self.imgsz - new_h - pad_y, pad_x, self.imgsz - new_w - pad_x,
+                                    cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+        blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+        return blob, scale, pad_x, pad_y
+
+    def _postprocess(self, output, scale, pad_x, pad_y, shape):
+        # YOLOv8 output: (1, 4 + classes, anchors) with cx, cy, w, h in letterbox pixels
+        predictions = np.squeeze(output, axis=0).T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = confidences >= self.conf
+        if not keep.any():
+            return []
+        predictions, class_ids, confidences = predictions[keep], class_ids[keep], confidences[keep]
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        x1 = np.clip((cx - w / 2 - pad_x) / scale, 0, shape[1])
+        y1 = np.clip((cy - h / 2 - pad_y) / scale, 0, shape[0])
+        x2 = np.clip((cx + w / 2 - pad_x) / scale, 0, shape[1])
+        y2 = np.clip((cy + h / 2 - pad_y) / scale, 0, shape[0])
+        rects = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+        indices = cv2.dnn.NMSBoxesBatched(rects.tolist(), confidences.tolist(), class_ids.tolist(),
+                                          self.conf, NMS_IOU_THRESHOLD)
+        return [(int(x1[i]), int(y1[i]), int(x2[i]), int(y2[i]), float(confidences[i]), int(class_ids[i]))
+                for i in np.array(indices).flatten()]
+
+    def _set_names(self, raw_names):
+        """Class names from the export metadata (a dict literal written by ultralytics)."""
+        if not raw_names:
+            return
+        try:
+            self.names = {int(k): v for k, v in ast.literal_eval(raw_names).items()}
+        except (ValueError, SyntaxError):
+            pass
+
+class OnnxDetector(ExportedYoloDetector):
+    """The ONNX export run by ONNX Runtime on the CPU."""
+    def __init__(self, model_path, imgsz, conf, threads):
+        super().__init__(imgsz, conf)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self._set_names(self.session.get_modelmeta().custom_metadata_map.get("names"))
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+class OpenVinoDetector(ExportedYoloDetector):
+    """The OpenVINO IR export compiled for the CPU."""
+    def __init__(self, model_path, imgsz, conf, threads):
+        super().__init__(imgsz, conf)
+        import openvino as ov
+        core = ov.Core()
+        xml_path = model_path
+        if os.path.isdir(model_path):
+            xml_path = next(os.path.join(model_path, f) for f in os.listdir(model_path) if f.endswith(".xml"))
+            metadata_path = os.path.join(model_path, "metadata.yaml")
+            if os.path.exists(metadata_path):
+                import yaml
+                with open(metadata_path) as f:
+                    self._set_names(str((yaml.safe_load(f) or {}).get("names", "")))
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(core.read_model(xml_path), "CPU", config)
+
+    def _infer(self, blob):
+        return self.compiled(blob)[0]
+
+# =================================================================
+# Section 3: Backend Selection
+# =================================================================
+def load_detector(model_path, backend="torch", imgsz=640, conf=0.25, threads=0, int8=False):
+    """
+    Builds the detector for backend ("torch", "onnx" or "openvino"), exporting
+    model_path first if needed. threads sets the intra-op thread count (0 keeps
+    the runtime default); int8 selects the quantized export.
+    """
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}', expected one of {DETECTOR_BACKENDS}")
+    path = export_model(model_path, backend, imgsz, int8)
+    if backend == "onnx":
+        return OnnxDetector(path, imgsz, conf, threads)
+    if backend == "openvino":
+        return OpenVinoDetector(path, imgsz, conf, threads)
+    return TorchDetector(path, imgsz, conf, threads)
@@ -0,0 +1,207 @@
+"""
+Fall event recorder for backend_server.py.
+
+Each camera keeps the last RECORD_PRE_SECONDS of received JPEGs in memory,
+exactly as the sender compressed them. When a fall is detected, those frames
+plus the next RECORD_POST_SECONDS are written to an MJPEG file (the JPEGs
+back to back, playable with e.g. `ffplay -f mjpeg clip.mjpeg`) with a JSON
+sidecar holding frame timestamps and the fall scores seen meanwhile.
+
+Memory is bounded per camera: the ring buffer holds at most RECORD_BUFFER_BYTES
+and a clip being recorded at most RECORD_BUFFER_BYTES + RECORD_POST_BYTES,
+because it shares the buffered frames and adds post-event frames up to its own
+limit. Files are written by one background thread; if it falls behind, new
+clips are dropped rather than ever blocking ingest. The same thread finishes
+clips whose post-event time ran out without new frames (a camera that froze
+or disconnected after the fall); closing a camera's connection finishes its
+clip right away.
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+RECORD_DIR = "fall_clips"                  # Where clips and their sidecars are written
+RECORD_PRE_SECONDS = 5.0                   # Seconds of video kept from before the fall
+RECORD_POST_SECONDS = 5.0                  # Seconds of video recorded after the fall
+RECORD_BUFFER_BYTES = 16 * 1024 * 1024     # Hard cap of the pre-event ring buffer, per camera
+RECORD_POST_BYTES = 16 * 1024 * 1024       # Hard cap of the post-event frames of one clip
+WRITER_QUEUE_CLIPS = 4                     # Finished clips waiting for the disk before new ones are dropped
+FLUSH_CHECK_INTERVAL = 1.0                 # Seconds between checks for clips whose post-event time is over
+
+# =================================================================
+# Section 1: Pre-Event Ring Buffer
+# =================================================================
+class FrameRingBuffer:
+    """The last `seconds` of (timestamp, jpeg) pairs, never more than max_bytes in total."""
+    def __init__(self, seconds=RECORD_PRE_SECONDS, max_bytes=RECORD_BUFFER_BYTES):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.total_bytes = 0
+
+    def append(self, timestamp, jpeg):
+        self.frames.append((timestamp, jpeg))
+        self.total_bytes += len(jpeg)
+        while self.frames and (self.total_bytes > self.max_bytes or self.frames[0][0] < timestamp - self.seconds):
+            _, old = self.frames.popleft()
+            self.total_bytes -= len(old)
+
+    def snapshot(self):
+        return list(self.frames)
+
+# =================================================================
+# Section 2: Clip Writer Thread
+# =================================================================
+class FallClip:
+    """Frames and scores collected around one fall event."""
+    def __init__(self, camera_id, event_time, reason, pre_frames, pre_scores):
+        self.camera_id = camera_id
+        self.event_time = event_time
+        self.end_time = event_time + RECORD_POST_SECONDS
+        self.reason = reason
+        self.frames = pre_frames
+        self.post_bytes = 0
+        self.scores = pre_scores
+        self.events = [{"t": event_time, "reason": reason}]
+
+class ClipWriter:
+    """Writes finished clips on its own thread so disk I/O never blocks the caller."""
+    def __init__(self, directory=RECORD_DIR):
+        self.directory = directory
+        self.queue = queue.Queue(maxsize=WRITER_QUEUE_CLIPS)
+        self.written = 0
+        self.dropped = 0
+        self.recorders = []          # CameraRecorders whose overdue clips the thread finishes
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, recorder):
+        with self._lock:
+            self.recorders.append(recorder)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, clip):
+        try:
+            self.queue.put_nowait(clip)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"[!] Clip writer is behind; dropped the clip of camera '{clip.camera_id}'")
+            return False
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        next_check = time.monotonic() + FLUSH_CHECK_INTERVAL
+        while True:
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + FLUSH_CHECK_INTERVAL
+                self._flush_overdue()
+            try:
+                clip = self.queue.get(timeout=max(0.0, next_check - time.monotonic()))
+            except queue.Empty:
+                continue
+            try:
+                path = self.write(clip)
+                self.written += 1
+                print(f"[INFO] Saved fall clip {path} ({len(clip.frames)} frames)")
+            except OSError as e:
+                print(f"[!] Failed to save fall clip of camera '{clip.camera_id}': {e}")
+
+    def _flush_overdue(self):
+        with self._lock:
+            recorders = list(self.recorders)
+        now = time.time()
+        for recorder in recorders:
+            recorder.flush(now)
+
+    def write(self, clip):
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", clip.camera_id)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(clip.event_time))
+        base = os.path.join(self.directory, f"{safe_id}_{stamp}_{int(clip.event_time * 1000) % 1000:03d}")
+        frames = []
+        offset = 0
+        with open(base + ".mjpeg", "wb") as f:
+            for timestamp, jpeg in clip.frames:
+                f.write(jpeg)
+                frames.append({"t": timestamp, "offset": offset, "size": len(jpeg)})
+                offset += len(jpeg)
+        sidecar = {
+            "camera": clip.camera_id,
+            "event_time": clip.event_time,
+            "reason": clip.reason,
+            "events": clip.events,
+            "frames": frames,
+            "scores": clip.scores,
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(sidecar, f, indent=1)
+        return base + ".mjpeg"
+
+# =================================================================
+# Section 3: Per-Camera Recorder
+# =================================================================
+class CameraRecorder:
+    """
+    Called from the ingest path with every stored frame and from detection
+    with scores and fall triggers. All calls only touch memory.
+    """
+    def __init__(self, camera_id, writer):
+        self.camera_id = camera_id
+        self.writer = writer
+        self.ring = FrameRingBuffer()
+        self.recent_scores = deque()
+        self.clip = None
+        self._lock = threading.Lock()
+        writer.register(self)
+
+    def add_frame(self, jpeg, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        finished = None
+        with self._lock:
+            self.ring.append(timestamp, jpeg)
+            clip = self.clip
+            if clip is not None:
+                if timestamp > clip.end_time or clip.post_bytes + len(jpeg) > RECORD_POST_BYTES:
+                    finished, self.clip = clip, None
+                else:
+                    clip.frames.append((timestamp, jpeg))
+                    clip.post_bytes += len(jpeg)
+        if finished is not None:
+            self.writer.submit(finished)
+
+    def add_scores(self, scores, timestamp=None):
+        """Records the per-person fall scores ({person_id: score}) of one analysed frame."""
+        entry = {"t": time.time() if timestamp is None else timestamp, "scores": scores}
+        with self._lock:
+            self.recent_scores.append(entry)
+            while self.recent_scores and self.recent_scores[0]["t"] < entry["t"] - RECORD_PRE_SECONDS:
+                self.recent_scores.popleft()
+            if self.clip is not None:
+                self.clip.scores.append(entry)
+
+    def trigger(self, reason, timestamp=None):
+        """Starts a clip (or extends the running one) for a fall event."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self.clip is not None:
+                self.clip.end_time = max(self.clip.end_time, timestamp + RECORD_POST_SECONDS)
+                self.clip.events.append({"t": timestamp, "reason": reason})
+                return
+            self.clip = FallClip(self.camera_id, timestamp, reason,
+                                 self.ring.snapshot(), list(self.recent_scores))
+
+    def flush(self, now=None):
+        """Hands the running clip to the writer: right away, or with `now` only once its post-event time is over."""
+        with self._lock:
+            clip = self.clip
+            if clip is None or (now is not None and now <= clip.end_time):
+                return
+            self.clip = None
+        self.writer.submit(clip)
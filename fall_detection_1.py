@@ -1,50 +1,158 @@
 import cv2
-import mediapipe as mp
 import math
-from ultralytics import YOLO
+import numpy as np
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from detector_backends import load_detector
+from fall_state import FALL_ENTER_THRESHOLD, FallStateMachine
+from metrics import DEBUG_LOGGING, histogram
 import time
 
 # =================================================================
 # Section 1: Basic Parameter Settings
 # =================================================================
-YOLO_MODEL_PATH = "/home/tku-im-sd/backend_project/yolov8n.pt"
-FALL_THRESHOLD = 0.5
+YOLO_MODEL_PATH = os.environ.get("YOLO_MODEL_PATH", "/home/tku-im-sd/backend_project/yolov8n.pt")
 VISIBILITY_THRESHOLD = 0.55
+POSE_WORKERS = min(4, os.cpu_count() or 1)   # Threads running MediaPipe Pose on person crops in parallel
+
+# Detector stage (see detector_backends.py)
+DETECTOR_BACKEND = "torch"           # "torch" (.pt via ultralytics), "onnx" (ONNX Runtime) or "openvino"
+DETECTOR_IMGSZ = 640                 # Model input resolution; smaller is faster but misses small people
+DETECTOR_THREADS = 0                 # Intra-op threads for the detector (0 = runtime default)
+DETECTOR_INT8 = False                # Use the INT8-quantized export (onnx / openvino only)
+DETECTOR_CONFIDENCE = 0.25           # Minimum detection confidence
 
 # =================================================================
 # Section 2: Initialize YOLO Model and MediaPipe Pose
 # =================================================================
+# Loaded by load_models() on first use rather than at import, so importing this
+# module stays cheap and a missing model cannot break the importer
+yolo_model = None
+mp_pose = None
+_models_lock = threading.Lock()
+
 def load_yolo_model(model_path):
     try:
-        return YOLO(model_path)
+        return load_detector(model_path, backend=DETECTOR_BACKEND, imgsz=DETECTOR_IMGSZ,
+                             conf=DETECTOR_CONFIDENCE, threads=DETECTOR_THREADS, int8=DETECTOR_INT8)
     except Exception as e:
-        print(f"[ERROR] Failed to load YOLO model: {e}")
+        print(f"[ERROR] Failed to load YOLO model ({DETECTOR_BACKEND} backend): {e}")
         raise
 
-yolo_model = load_yolo_model(YOLO_MODEL_PATH)
+def load_models():
+    """Imports MediaPipe and loads the YOLO detector once. Returns the detector; later calls return at once."""
+    global yolo_model, mp_pose
+    if yolo_model is not None:
+        return yolo_model
+    with _models_lock:
+        if yolo_model is None:
+            import mediapipe as mp
+            mp_pose = mp.solutions.pose
+            yolo_model = load_yolo_model(YOLO_MODEL_PATH)
+    return yolo_model
 
-mp_pose = mp.solutions.pose
-pose_detector = mp_pose.Pose(
-    static_image_mode=False,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-mp_drawing = mp.solutions.drawing_utils
+def warm_up():
+    """
+    Loads the models and runs one detection and one pose estimation on blank
+    images, so the first real frame does not pay for lazy initialisation.
+    """
+    detector = load_models()
+    detector.detect(np.zeros((DETECTOR_IMGSZ, DETECTOR_IMGSZ, 3), np.uint8))
+    estimator = create_pose_estimator()
+    try:
+        estimator.process(np.zeros((256, 192, 3), np.uint8))
+    finally:
+        estimator.close()
+
+def create_pose_estimator():
+    """A MediaPipe Pose instance keeps tracking state, so each person gets their own."""
+    load_models()
+    return mp_pose.Pose(
+        static_image_mode=False,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+# MediaPipe releases the GIL while its graph runs, so crops of different people
+# can be estimated concurrently on plain threads
+pose_executor = ThreadPoolExecutor(max_workers=POSE_WORKERS, thread_name_prefix="pose")
+
+def estimate_poses(crops, pose_estimators):
+    """
+    Runs pose estimation on several RGB person crops at once.
+    `crops` maps a person key to its crop; `pose_estimators` maps the same keys
+    to their own MediaPipe Pose instance and is filled in for new keys.
+    Returns a dict of key -> MediaPipe result.
+    """
+    for key in crops:
+        if key not in pose_estimators:
+            pose_estimators[key] = create_pose_estimator()
+    if len(crops) == 1:
+        key, crop = next(iter(crops.items()))
+        return {key: pose_estimators[key].process(crop)}
+    futures = {key: pose_executor.submit(pose_estimators[key].process, crop)
+               for key, crop in crops.items()}
+    return {key: future.result() for key, future in futures.items()}
 
 # =================================================================
 # Section 3: Sliding Window Smoothing for Landmarks
 # =================================================================
 WINDOW_SIZE = 5
-landmark_history = {}
+NUM_LANDMARKS = 33
+
+def landmarks_to_array(landmarks):
+    """Converts MediaPipe landmarks to a (33, 3) array of x, y, visibility."""
+    return np.array([(lm.x, lm.y, lm.visibility) for lm in landmarks], dtype=np.float64)
+
+class LandmarkWindow:
+    """
+    Sliding-window average of one person's landmarks kept in NumPy.
+    A (window, 33, 2) ring buffer holds the last visible positions of each
+    landmark and a running sum makes every update O(33) with no Python loop.
+    Gives the same result as smooth_landmarks_window().
+    """
+    RESYNC_INTERVAL = 1000   # Recompute the running sums from the buffer now and then to cancel float drift
+
+    def __init__(self, window=WINDOW_SIZE, num_landmarks=NUM_LANDMARKS):
+        self.window = window
+        self.history = np.zeros((window, num_landmarks, 2))
+        self.sums = np.zeros((num_landmarks, 2))
+        self.counts = np.zeros(num_landmarks, dtype=np.int64)
+        self.heads = np.zeros(num_landmarks, dtype=np.int64)   # next slot to write, per landmark
+        self._updates = 0
+
+    def update(self, raw):
+        """Adds a (33, 3) x/y/visibility array and returns the smoothed (33, 3) array."""
+        visible = np.flatnonzero(raw[:, 2] >= VISIBILITY_THRESHOLD)
+        slots = self.heads[visible]
+        evicted = self.history[slots, visible]
+        evicted[self.counts[visible] < self.window] = 0.0
+        self.sums[visible] += raw[visible, :2] - evicted
+        self.history[slots, visible] = raw[visible, :2]
+        self.heads[visible] = (slots + 1) % self.window
+        self.counts[visible] = np.minimum(self.counts[visible] + 1, self.window)
+
+        self._updates += 1
+        if self._updates % self.RESYNC_INTERVAL == 0:
+            filled = np.arange(self.window)[:, None] < self.counts[None, :]
+            self.sums = (self.history * filled[..., None]).sum(axis=0)
 
+        smoothed = raw.copy()
+        seen = self.counts > 0
+        smoothed[seen, :2] = self.sums[seen] / self.counts[seen, None]
+        return smoothed
+
+# Reference implementation of the smoothing above, one Python object per landmark
 class SmoothedLandmark:
     def __init__(self, x, y, visibility):
         self.x = x
         self.y = y
         self.visibility = visibility
 
-def smooth_landmarks_window(landmarks):
-    global landmark_history
+def smooth_landmarks_window(landmarks, landmark_history):
+    """Averages each landmark over the last WINDOW_SIZE visible positions kept in landmark_history (one per person)."""
     smoothed = []
     # Process each landmark with a sliding window average
     for i, lm in enumerate(landmarks):
@@ -74,6 +182,42 @@ def angle_from_vertical(dx, dy):
 def clamp(val, min_val, max_val):
     return max(min_val, min(val, max_val))
 
+def angles_from_vertical(dx, dy):
+    """Vectorized angle_from_vertical for arrays of dx, dy."""
+    dx = np.abs(dx)
+    dy = np.abs(dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        degrees = np.degrees(np.arctan(dx / dy))
+    return np.where(dy < 1e-6, 90.0, degrees)
+
+def compute_fall_scores(landmarks):
+    """
+    Vectorized compute_fall_score: takes an array of shape (..., 33, >=2) holding
+    x, y per landmark (for one person, many people or many frames) and returns
+    the fall scores with shape (...).
+    """
+    lm = np.asarray(landmarks, dtype=np.float64)
+    x = lm[..., 0]
+    y = lm[..., 1]
+
+    # (A) Height difference between head and ankles
+    head_ankle_diff = np.maximum((y[..., 27] + y[..., 28]) / 2 - y[..., 0], 0.0)
+    score_head = 1.0 - np.clip((head_ankle_diff - 0.1) / 0.4, 0.0, 1.0)
+
+    # (B) Torso inclination between shoulder and hip centers
+    dx_torso = (x[..., 23] + x[..., 24]) / 2 - (x[..., 11] + x[..., 12]) / 2
+    dy_torso = (y[..., 23] + y[..., 24]) / 2 - (y[..., 11] + y[..., 12]) / 2
+    score_torso = np.clip((angles_from_vertical(dx_torso, dy_torso) - 30) / 60.0, 0.0, 1.0)
+
+    # (C) Steeper of the two thigh angles
+    deg_leg = np.maximum(angles_from_vertical(x[..., 25] - x[..., 23], y[..., 25] - y[..., 23]),
+                         angles_from_vertical(x[..., 26] - x[..., 24], y[..., 26] - y[..., 24]))
+    score_leg = np.clip((deg_leg - 30) / 60.0, 0.0, 1.0)
+
+    return 0.4 * score_head + 0.4 * score_torso + 0.2 * score_leg
+
+# Reference (scalar) implementation of the fall score
+
 def compute_fall_score(landmarks):
     # (A) Height difference between head and ankles using landmark 0 and landmarks 27, 28
     head_y = landmarks[0].y
@@ -82,7 +226,8 @@ def compute_fall_score(landmarks):
     if head_ankle_diff < 0:
         head_ankle_diff = 0
     score_head = 1.0 - clamp((head_ankle_diff - 0.1) / 0.4, 0.0, 1.0)
-    print(f"[DEBUG] head_ankle_diff: {head_ankle_diff:.3f}, score_head: {score_head:.3f}")
+    if DEBUG_LOGGING:
+        print(f"[DEBUG] head_ankle_diff: {head_ankle_diff:.3f}, score_head: {score_head:.3f}")
 
     # (B) Torso inclination using landmarks 11, 12 (shoulders) and 23, 24 (hips)
     shoulder_center_x = (landmarks[11].x + landmarks[12].x) / 2
@@ -98,7 +243,8 @@ def compute_fall_score(landmarks):
         score_torso = 1.0
     else:
         score_torso = (deg_torso - 30) / 60.0
-    print(f"[DEBUG] deg_torso: {deg_torso:.1f}, score_torso: {score_torso:.3f}")
+    if DEBUG_LOGGING:
+        print(f"[DEBUG] deg_torso: {deg_torso:.1f}, score_torso: {score_torso:.3f}")
 
     # (C) Leg angle using landmarks for thighs (25, 26) relative to hips (23, 24)
     left_leg_dx = landmarks[25].x - landmarks[23].x
@@ -114,70 +260,348 @@ def compute_fall_score(landmarks):
         score_leg = 1.0
     else:
         score_leg = (deg_leg - 30) / 60.0
-    print(f"[DEBUG] deg_leg: {deg_leg:.1f}, score_leg: {score_leg:.3f}")
+    if DEBUG_LOGGING:
+        print(f"[DEBUG] deg_leg: {deg_leg:.1f}, score_leg: {score_leg:.3f}")
 
     # Weighted average of the three scores
     w_head = 0.4
     w_torso = 0.4
     w_leg = 0.2
     fall_score = w_head * score_head + w_torso * score_torso + w_leg * score_leg
-    print(f"[DEBUG] fall_score: {fall_score:.3f}")
+    if DEBUG_LOGGING:
+        print(f"[DEBUG] fall_score: {fall_score:.3f}")
     return fall_score
 
 # =================================================================
-# Section 5: Process Frame for Fall Detection
+# Section 5: Motion Gating
+# =================================================================
+MOTION_DOWNSCALE_WIDTH = 160       # Width of the grey thumbnail compared between frames
+MOTION_PIXEL_THRESHOLD = 25        # Grey-level change that marks a thumbnail pixel as changed
+MOTION_AREA_THRESHOLD = 0.005      # Share of changed pixels that counts as motion
+FORCE_INFERENCE_INTERVAL = 1.0     # Seconds after which a full inference runs even without motion
+
+class MotionGate:
+    """
+    Cheap pre-filter in front of YOLO + MediaPipe: compares a small blurred grey
+    thumbnail of the frame with the one of the last analysed frame and lets the
+    frame through only when enough of it changed, or when the last full
+    inference is older than FORCE_INFERENCE_INTERVAL.
+    """
+    def __init__(self):
+        self.reference = None
+        self.last_inference_time = 0.0
+        self.frames_analysed = 0
+        self.frames_skipped = 0
+
+    def _thumbnail(self, frame):
+        height = max(1, frame.shape[0] * MOTION_DOWNSCALE_WIDTH // frame.shape[1])
+        small = cv2.resize(frame, (MOTION_DOWNSCALE_WIDTH, height), interpolation=cv2.INTER_AREA)
+        grey = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(grey, (5, 5), 0)
+
+    def should_analyse(self, frame, now):
+        thumbnail = self._thumbnail(frame)
+        analyse = (self.reference is None
+                   or self.reference.shape != thumbnail.shape
+                   or now - self.last_inference_time >= FORCE_INFERENCE_INTERVAL)
+        if not analyse:
+            diff = cv2.absdiff(thumbnail, self.reference)
+            changed = cv2.countNonZero(cv2.threshold(diff, MOTION_PIXEL_THRESHOLD, 255, cv2.THRESH_BINARY)[1])
+            analyse = changed >= MOTION_AREA_THRESHOLD * diff.size
+        if analyse:
+            # Compare against the last analysed frame so slow changes still add up
+            self.reference = thumbnail
+            self.last_inference_time = now
+            self.frames_analysed += 1
+        else:
+            self.frames_skipped += 1
+        return analyse
+
+# =================================================================
+# Section 6: Person Tracking
+# =================================================================
+TRACK_IOU_THRESHOLD = 0.3      # Minimum box overlap to keep the same person ID between frames
+TRACK_TTL = 2.0                # Seconds a person may go undetected before their track expires
+POSE_SKIP_IOU = 0.95           # Tracks whose box barely moved since their last pose estimation...
+POSE_REFRESH_INTERVAL = 0.5    # ...reuse that pose for at most this many seconds
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class PersonTrack:
+    """Everything kept for one tracked person: box, smoothing window, last pose and fall status."""
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = now
+        self.landmark_window = LandmarkWindow()
+        self.previous_smoothed_landmarks = None   # (33, 3) array
+        self.pose_box = None           # box at the last pose estimation
+        self.pose_time = 0.0
+        self.fall_score = 0.0
+        self.fall_state = FallStateMachine(track_id, enter_threshold=FALL_ENTER_THRESHOLD)
+
+    def pose_is_fresh(self, now):
+        """True when the person has not moved enough since the last pose to be worth re-estimating."""
+        return (self.previous_smoothed_landmarks is not None
+                and self.pose_box is not None
+                and now - self.pose_time < POSE_REFRESH_INTERVAL
+                and box_iou(self.box, self.pose_box) >= POSE_SKIP_IOU)
+
+class PersonTracker:
+    """Greedy IoU association of YOLO person boxes to stable person IDs."""
+    def __init__(self):
+        self.tracks = {}
+        self.pose_estimators = {}      # track_id -> MediaPipe Pose, see estimate_poses()
+        self.ended_events = []         # fall events closed because their person's track expired
+        self._next_id = 1
+
+    def update(self, boxes, now):
+        """Matches this frame's boxes to tracks, starts new tracks and expires stale ones. Returns the matched tracks in box order."""
+        candidates = sorted(((box_iou(track.box, box), track_id, index)
+                             for track_id, track in self.tracks.items()
+                             for index, box in enumerate(boxes)), reverse=True)
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for iou, track_id, index in candidates:
+            if iou < TRACK_IOU_THRESHOLD:
+                break
+            if track_id in used_tracks or assigned[index] is not None:
+                continue
+            used_tracks.add(track_id)
+            assigned[index] = self.tracks[track_id]
+
+        for index, box in enumerate(boxes):
+            track = assigned[index]
+            if track is None:
+                track = PersonTrack(self._next_id, box, now)
+                self.tracks[track.track_id] = track
+                self._next_id += 1
+                assigned[index] = track
+            track.box = box
+            track.last_seen = now
+
+        for track_id in [tid for tid, track in self.tracks.items() if now - track.last_seen > TRACK_TTL]:
+            event = self.tracks.pop(track_id).fall_state.close(now)
+            if event is not None:
+                self.ended_events.append(event)
+            estimator = self.pose_estimators.pop(track_id, None)
+            if estimator is not None:
+                estimator.close()
+        return assigned
+
+FALL_EVENT_HISTORY = 100      # Fall events kept per stream in DetectionState.fall_events
+
+class DetectionState:
+    """
+    Per-stream state carried between frames: the tracked people, each with
+    their own smoothing window, pose estimator and fall status, plus the
+    motion gate and the last result reused while nothing moves.
+    Each camera stream should own one instance so streams never mix.
+    """
+    def __init__(self):
+        self.tracker = PersonTracker()
+        self.motion_gate = MotionGate()
+        self.last_fall_detected = False
+        self.fallen_people = {}    # track_id -> last fall score of every tracked person whose fall is confirmed
+        self.last_overlays = []    # (box, track_id, fall_score, fall_detected) drawn on skipped frames
+        self.last_objects = []     # (box, label, confidence) of every detector box in the last analysed frame
+        self.fall_events = deque(maxlen=FALL_EVENT_HISTORY)   # recent FallEvents, newest last
+
+default_state = DetectionState()
+
+# =================================================================
+# Section 7: Process Frame for Fall Detection
 # =================================================================
-previous_smoothed_landmarks = None
+def label_of(cls, names):
+    return names.get(cls, str(cls)) if hasattr(names, "get") else names[cls]
 
-def process_frame(frame):
+def extract_person_boxes(detections, names):
+    """Returns the (x1, y1, x2, y2) boxes of every "person" detection, ordered left to right."""
+    boxes = []
+    for x1, y1, x2, y2, _, cls in detections:
+        label = label_of(cls, names)
+        if label.lower() == "person" or cls == 0:
+            boxes.append((x1, y1, x2, y2))
+    boxes.sort()
+    return boxes
+
+def draw_detections(image, detections, names):
+    """Draws every detector box with its class name and confidence."""
+    for x1, y1, x2, y2, confidence, cls in detections:
+        label = label_of(cls, names)
+        cv2.rectangle(image, (x1, y1), (x2, y2), (255, 128, 0), 2)
+        cv2.putText(image, f"{label} {confidence:.2f}", (x1, y2 - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 128, 0), 1)
+
+def draw_person_overlay(image, box, track_id, fall_score, fall_detected):
+    x1, y1, x2, y2 = box
+    color = (0, 0, 255) if fall_detected else (0, 255, 0)
+    text = f"ID {track_id} Fall Score: {fall_score:.2f}"
+    cv2.putText(image, text, (x1, y1 - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+    cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+
+def record_fall_event(state, event):
+    if event.end is None:
+        state.fall_events.append(event)
+        print(f"[INFO] Person {event.person_id}: fall detected (peak score {event.peak_score:.2f})")
+    else:
+        print(f"[INFO] Person {event.person_id}: fall ended after {event.end - event.start:.1f}s")
+
+STAGE_SECONDS = histogram("fall_detection_stage_seconds", "Time spent in each process_frame stage", ("stage",))
+
+def record_timing(timings, stage, start):
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    if timings is not None:
+        timings.setdefault(stage, []).append(elapsed)
+
+def process_frame(frame, state=None, now=None, timings=None, annotate=True):
     """
     Applies YOLO detection on the input BGR frame and uses MediaPipe Pose to extract landmarks for the "person" region.
     The function applies sliding window smoothing for a fall score calculation.
     If the current frame's detection fails, it falls back to previous frame data.
+    Frames that barely differ from the last analysed one skip detection and reuse its result.
+    `state` holds the per-stream history (a DetectionState); the module default is used when omitted.
+    `now` is the frame time in seconds (time.monotonic() when omitted); pass video time when replaying files.
+    `timings`, if given, is a dict that collects per-stage durations in seconds
+    ("gate", "detect", "pose", "score", "annotate"), one list entry per call.
+    With annotate=False nothing is drawn and annotated_frame is None; use
+    detection_metadata() to publish the result instead.
+    A person counts as fallen once their fall state machine confirms it, not on a single high score,
+    and stays fallen until it recovers or their track expires, even in frames where YOLO misses them.
     Returns a tuple: (fall_detected_overall, annotated_frame)
     """
-    global previous_smoothed_landmarks
-    results = yolo_model.predict(source=frame, device='cpu')
-    annotated_frame = results[0].plot(line_width=2)
-    fall_detected_overall = False
-
-    print(f"[DEBUG] YOLO results: {results[0].names}")
-
-    for result in results:
-        for box in result.boxes:
-            cls = int(box.cls[0])
-            label = result.names.get(cls, str(cls)) if hasattr(result.names, "get") else result.names[cls]
-            if label.lower() == "person" or cls == 0:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                person_img = frame[y1:y2, x1:x2]
-                if person_img.size == 0:
-                    continue
-                person_rgb = cv2.cvtColor(person_img, cv2.COLOR_BGR2RGB)
-                results_pose = pose_detector.process(person_rgb)
-                if not results_pose.pose_landmarks:
-                    print("[DEBUG] No Pose detected in current frame; using previous frame data")
-                    if previous_smoothed_landmarks is not None:
-                        smoothed_landmarks = previous_smoothed_landmarks
-                    else:
-                        continue
-                else:
-                    raw_landmarks = results_pose.pose_landmarks.landmark
-                    smoothed_landmarks = smooth_landmarks_window(raw_landmarks)
-                    previous_smoothed_landmarks = smoothed_landmarks
-
-                fall_score = compute_fall_score(smoothed_landmarks)
-                color = (0, 0, 255) if fall_score >= FALL_THRESHOLD else (0, 255, 0)
-                text = f"Fall Score: {fall_score:.2f}"
-                cv2.putText(annotated_frame, text, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                if fall_score >= FALL_THRESHOLD:
-                    fall_detected_overall = True
+    if state is None:
+        state = default_state
+    if now is None:
+        now = time.monotonic()
+    start = time.perf_counter()
+    analyse = state.motion_gate.should_analyse(frame, now)
+    record_timing(timings, "gate", start)
+    if not analyse:
+        if not annotate:
+            return state.last_fall_detected, None
+        start = time.perf_counter()
+        annotated_frame = frame.copy()
+        for overlay in state.last_overlays:
+            draw_person_overlay(annotated_frame, *overlay)
+        record_timing(timings, "annotate", start)
+        return state.last_fall_detected, annotated_frame
+
+    detector = load_models()
+    start = time.perf_counter()
+    detections = detector.detect(frame)
+    if DEBUG_LOGGING:
+        print(f"[DEBUG] YOLO detections: {len(detections)}")
+    boxes = [box for box in extract_person_boxes(detections, detector.names)
+             if box[2] > box[0] and box[3] > box[1]]
+    tracks = state.tracker.update(boxes, now)
+    for event in state.tracker.ended_events:
+        record_fall_event(state, event)
+    state.tracker.ended_events.clear()
+    record_timing(timings, "detect", start)
+
+    # Crop every person that moved so all crops go through pose estimation together;
+    # people standing still keep their previous pose for a short while
+    start = time.perf_counter()
+    crops = {}
+    for track in tracks:
+        if track.pose_is_fresh(now):
+            continue
+        x1, y1, x2, y2 = track.box
+        crops[track.track_id] = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+    pose_results = estimate_poses(crops, state.tracker.pose_estimators)
+    record_timing(timings, "pose", start)
 
+    start = time.perf_counter()
+    scored_tracks = []
+    smoothed = []
+    for track in tracks:
+        results_pose = pose_results.get(track.track_id)
+        if results_pose is None:
+            smoothed_landmarks = track.previous_smoothed_landmarks
+        elif not results_pose.pose_landmarks:
+            if DEBUG_LOGGING:
+                print(f"[DEBUG] No Pose detected for person {track.track_id}; using their previous frame data")
+            if track.previous_smoothed_landmarks is not None:
+                smoothed_landmarks = track.previous_smoothed_landmarks
+            else:
+                continue
+        else:
+            raw_landmarks = landmarks_to_array(results_pose.pose_landmarks.landmark)
+            smoothed_landmarks = track.landmark_window.update(raw_landmarks)
+            track.previous_smoothed_landmarks = smoothed_landmarks
+            track.pose_box = track.box
+            track.pose_time = now
+        scored_tracks.append(track)
+        smoothed.append(smoothed_landmarks)
+
+    # Score everyone in the frame in one vectorized call
+    fall_scores = compute_fall_scores(np.stack(smoothed)) if smoothed else []
+    overlays = []
+    for track, fall_score in zip(scored_tracks, fall_scores):
+        fall_score = float(fall_score)
+        track.fall_score = fall_score
+        event = track.fall_state.update(now, fall_score)
+        if event is not None:
+            record_fall_event(state, event)
+        overlays.append((track.box, track.track_id, fall_score, track.fall_state.is_fallen))
+    # A fallen person YOLO missed in this frame is still fallen: only their state
+    # machine recovering, or their track expiring, ends the fall
+    state.fallen_people = {track.track_id: track.fall_score for track in state.tracker.tracks.values()
+                           if track.fall_state.is_fallen}
+    fall_detected_overall = bool(state.fallen_people)
+    record_timing(timings, "score", start)
+
+    state.last_fall_detected = fall_detected_overall
+    state.last_overlays = overlays
+    state.last_objects = [((x1, y1, x2, y2), label_of(cls, detector.names), confidence)
+                          for x1, y1, x2, y2, confidence, cls in detections]
+    if not annotate:
+        return fall_detected_overall, None
+
+    start = time.perf_counter()
+    annotated_frame = frame.copy()
+    draw_detections(annotated_frame, detections, detector.names)
+    for overlay in overlays:
+        draw_person_overlay(annotated_frame, *overlay)
+    record_timing(timings, "annotate", start)
     return fall_detected_overall, annotated_frame
 
+def detection_metadata(state, frame):
+    """
+    The last result of a stream as plain JSON-ready data, for clients that draw
+    the overlays themselves: frame size, detector boxes, and per person the
+    box, fall score, fallen flag and pose landmarks in frame pixels.
+    """
+    height, width = frame.shape[:2]
+    people = []
+    for box, track_id, fall_score, fallen in state.last_overlays:
+        track = state.tracker.tracks.get(track_id)
+        landmarks = None
+        if track is not None and track.previous_smoothed_landmarks is not None and track.pose_box is not None:
+            x1, y1, x2, y2 = track.pose_box
+            points = track.previous_smoothed_landmarks
+            landmarks = [[int(x1 + x * (x2 - x1)), int(y1 + y * (y2 - y1)), round(float(v), 2)]
+                         for x, y, v in points]
+        people.append({"id": track_id,
+                       "box": [int(v) for v in box],
+                       "score": round(fall_score, 3),
+                       "fallen": bool(fallen),
+                       "landmarks": landmarks})
+    objects = [{"box": [int(v) for v in box], "label": label, "confidence": round(float(confidence), 2)}
+               for box, label, confidence in state.last_objects]
+    return {"width": width, "height": height, "fall": bool(state.last_fall_detected),
+            "people": people, "objects": objects}
+
 # =================================================================
-# Section 6: Main Loop for Real-Time Fall Detection Testing
+# Section 8: Main Loop for Real-Time Fall Detection Testing
 # =================================================================
 if __name__ == '__main__':
     cap = cv2.VideoCapture(0)
@@ -0,0 +1,154 @@
+"""
+Per-person fall state machine for fall_detection.py.
+
+A single frame's fall score crossing FALL_ENTER_THRESHOLD is too jumpy to
+raise an alarm on. Each tracked person instead runs through
+
+    standing -> falling -> fallen -> recovered -> standing
+
+driven by a short time-indexed history of their scores:
+
+    standing/recovered -> falling   the score reaches FALL_ENTER_THRESHOLD, or rises
+                                    faster than FALL_VELOCITY_THRESHOLD per second
+                                    while above FALL_EXIT_THRESHOLD
+    falling -> fallen               after FALL_MIN_DWELL seconds, the mean score of
+                                    that time is at or above FALL_ENTER_THRESHOLD:
+                                    a fall event starts
+    falling -> standing             the mean score of the last VELOCITY_WINDOW dropped
+                                    below FALL_EXIT_THRESHOLD, or the fall was not
+                                    confirmed within FALLING_TIMEOUT
+    fallen -> recovered             the mean score of the last RECOVER_MIN_DWELL
+                                    seconds is below FALL_EXIT_THRESHOLD: the fall
+                                    event ends
+    recovered -> standing           after RECOVER_MIN_DWELL more seconds
+
+The gap between the enter and exit thresholds keeps a score hovering around
+one value from toggling the state, and judging dwell times on windowed means
+keeps a single noisy frame from resetting them. Timestamps are seconds in any
+base (time.monotonic() live, video time offline) as long as it is used
+consistently.
+"""
+from collections import deque
+
+FALL_ENTER_THRESHOLD = 0.5       # Score at which a person may be falling; fall_detection uses it too
+FALL_EXIT_THRESHOLD = 0.35       # Score below which a person counts as upright again
+FALL_VELOCITY_THRESHOLD = 1.0    # Score rise per second that starts "falling" before the enter threshold
+FALL_MIN_DWELL = 0.5             # Seconds at or above the enter threshold before a fall is confirmed
+FALLING_TIMEOUT = 3.0            # Seconds "falling" may last without being confirmed
+RECOVER_MIN_DWELL = 2.0          # Seconds below the exit threshold before a fall ends
+VELOCITY_WINDOW = 0.5            # Seconds of score history the velocity is measured over
+HISTORY_SECONDS = 5.0            # Seconds of score history kept per person
+
+STANDING = "standing"
+FALLING = "falling"
+FALLEN = "fallen"
+RECOVERED = "recovered"
+
+class FallEvent:
+    """One confirmed fall of one person. end stays None while the person is still down."""
+    def __init__(self, person_id, start, confirmed_at, score):
+        self.person_id = person_id
+        self.start = start                # when the person started falling
+        self.confirmed_at = confirmed_at  # when the fall was confirmed and reported
+        self.end = None                   # when the score first stayed low before recovery
+        self.peak_score = score
+
+    def to_dict(self):
+        return {"person": self.person_id, "start": self.start, "confirmed_at": self.confirmed_at,
+                "end": self.end, "peak_score": round(self.peak_score, 3)}
+
+    def __repr__(self):
+        return (f"FallEvent(person={self.person_id}, start={self.start:.2f}, "
+                f"confirmed_at={self.confirmed_at:.2f}, end={self.end})")
+
+class FallStateMachine:
+    """
+    Fall state of one person. Feed it every new score with update(); it
+    returns the FallEvent when a fall is confirmed or ends, None otherwise.
+    Keyword arguments override the module thresholds (used by the evaluator).
+    """
+    def __init__(self, person_id=None, enter_threshold=FALL_ENTER_THRESHOLD, exit_threshold=FALL_EXIT_THRESHOLD,
+                 velocity_threshold=FALL_VELOCITY_THRESHOLD, min_dwell=FALL_MIN_DWELL,
+                 falling_timeout=FALLING_TIMEOUT, recover_dwell=RECOVER_MIN_DWELL):
+        self.person_id = person_id
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.velocity_threshold = velocity_threshold
+        self.min_dwell = min_dwell
+        self.falling_timeout = falling_timeout
+        self.recover_dwell = recover_dwell
+        self.state = STANDING
+        self.state_since = None
+        self.falling_start = None
+        self.history = deque()     # (timestamp, score)
+        self.history_seconds = max(HISTORY_SECONDS, min_dwell, recover_dwell)
+        self.event = None          # the open FallEvent while fallen
+
+    @property
+    def is_fallen(self):
+        return self.state == FALLEN
+
+    def velocity(self):
+        """Score change per second over the last VELOCITY_WINDOW seconds of history."""
+        if len(self.history) < 2:
+            return 0.0
+        newest_time, newest_score = self.history[-1]
+        for timestamp, score in self.history:
+            if newest_time - timestamp <= VELOCITY_WINDOW:
+                break
+        elapsed = newest_time - timestamp
+        return (newest_score - score) / elapsed if elapsed > 0 else 0.0
+
+    def mean_score(self, seconds):
+        """Mean of the scores of the last `seconds` of history."""
+        newest_time = self.history[-1][0]
+        recent = [score for timestamp, score in self.history if newest_time - timestamp <= seconds]
+        return sum(recent) / len(recent)
+
+    def update(self, timestamp, score):
+        self.history.append((timestamp, score))
+        while self.history[0][0] < timestamp - self.history_seconds:
+            self.history.popleft()
+        if self.state_since is None:
+            self.state_since = timestamp
+        in_state = timestamp - self.state_since
+
+        if self.state in (STANDING, RECOVERED):
+            if score >= self.enter_threshold or (score >= self.exit_threshold
+                                                 and self.velocity() >= self.velocity_threshold):
+                self._set_state(FALLING, timestamp)
+                in_state = 0.0
+            elif self.state == RECOVERED and in_state >= self.recover_dwell:
+                self._set_state(STANDING, timestamp)
+        if self.state == FALLING:
+            if in_state >= self.min_dwell and self.mean_score(self.min_dwell) >= self.enter_threshold:
+                self._set_state(FALLEN, timestamp)
+                self.event = FallEvent(self.person_id, self.falling_start, timestamp, score)
+                return self.event
+            if self.mean_score(VELOCITY_WINDOW) < self.exit_threshold or in_state >= self.falling_timeout:
+                self._set_state(STANDING, timestamp)
+        elif self.state == FALLEN:
+            self.event.peak_score = max(self.event.peak_score, score)
+            if in_state >= self.recover_dwell and self.mean_score(self.recover_dwell) < self.exit_threshold:
+                self._set_state(RECOVERED, timestamp)
+                # The person got up around the start of the low-score window
+                return self._end_event(max(self.event.confirmed_at, timestamp - self.recover_dwell))
+        return None
+
+    def close(self, timestamp):
+        """Ends an open fall event when the person is no longer tracked. Returns it, or None."""
+        if self.state != FALLEN:
+            return None
+        self._set_state(STANDING, timestamp)
+        return self._end_event(timestamp)
+
+    def _set_state(self, state, timestamp):
+        if state == FALLING:
+            self.falling_start = timestamp
+        self.state = state
+        self.state_since = timestamp
+
+    def _end_event(self, timestamp):
+        event, self.event = self.event, None
+        event.end = timestamp
+        return event
@@ -0,0 +1,303 @@
+"""
+Fall detection in worker processes for backend_server.py.
+
+Inference inside the server process competes for the GIL with ingest and
+streaming. With INFERENCE_WORKERS > 0 the backend hands frames to a pool of
+worker processes instead:
+
+  * Each worker owns a shared-memory ring of slots. A slot holds a small
+    header (sequence number, JPEG length) and the received JPEG. The JPEG
+    is written once into shared memory and decoded straight from it by the
+    worker; only a tiny task tuple travels over the task queue.
+  * Results (fall flag, person overlays, fallen people, detection metadata,
+    gate counts and stage timings) come back on one result queue. Workers
+    draw nothing and encode nothing: viewers get the received JPEG, and
+    overlays are drawn from the metadata.
+  * Every camera is routed to one fixed worker, so its tracker and smoothing
+    state live in a single process and stay consistent. Cameras are spread
+    over the workers as they connect. When a worker fails or dies, its
+    cameras move to the remaining workers (their tracking starts over).
+  * Each worker has its own latest-wins queue in the parent; a frame waits
+    there until one of the worker's slots is free and is replaced by a newer
+    frame of the same camera in the meantime.
+
+Workers are started with the "spawn" method: forking a process that already
+runs threads is unsafe. A spawned worker imports this module and
+fall_detection_1, and also re-imports the script that started the server
+(backend_server_1 as __mp_main__), so that script's module-level setup, Flask
+included, runs once in every worker; its `if __name__ == '__main__'` block
+does not, so no server or thread starts there. Keep module-level code in the
+server script free of side effects.
+"""
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from stream_protocol import MAX_FRAME_SIZE
+
+SLOTS_PER_WORKER = 2               # Frames in flight per worker: one being processed, one queued behind it
+SLOT_BYTES = MAX_FRAME_SIZE        # Largest received JPEG a slot holds; pages are only backed once written
+WORKER_CHECK_INTERVAL = 1.0        # Seconds between checks that the workers are still alive
+SLOT_HEADER_FORMAT = "=QI"         # frame sequence number, JPEG length
+SLOT_HEADER_SIZE = struct.calcsize(SLOT_HEADER_FORMAT)
+
+# =================================================================
+# Section 1: Shared-Memory Slot Ring
+# =================================================================
+class FrameSlotRing:
+    """Fixed-size JPEG slots in one shared memory block."""
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.stride = SLOT_HEADER_SIZE + slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * self.stride)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def _offset(self, slot):
+        return slot * self.stride
+
+    def write_input(self, slot, seq, data):
+        offset = self._offset(slot)
+        struct.pack_into(SLOT_HEADER_FORMAT, self.shm.buf, offset, seq, len(data))
+        start = offset + SLOT_HEADER_SIZE
+        self.shm.buf[start:start + len(data)] = data
+
+    def read_input(self, slot):
+        """(seq, uint8 array viewing the JPEG in shared memory) — no copy."""
+        offset = self._offset(slot)
+        seq, length = struct.unpack_from(SLOT_HEADER_FORMAT, self.shm.buf, offset)
+        return seq, np.frombuffer(self.shm.buf, np.uint8, count=length, offset=offset + SLOT_HEADER_SIZE)
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+# =================================================================
+# Section 2: Worker Process
+# =================================================================
+def worker_main(index, shm_name, slots, slot_bytes, tasks, results):
+    """Entry point of one worker: loads the models, then runs detection on the frames put in its slots."""
+    ring = FrameSlotRing(slots, slot_bytes, name=shm_name)
+    start = time.monotonic()
+    try:
+        import fall_detection_1
+        fall_detection_1.load_models()
+        loaded = time.monotonic()
+        fall_detection_1.warm_up()
+    except Exception as e:
+        traceback.print_exc()
+        results.put(("status", index, "failed", f"{type(e).__name__}: {e}", None, None))
+        return
+    results.put(("status", index, "ready", None, loaded - start, time.monotonic() - loaded))
+
+    states = {}   # camera_id -> DetectionState; every camera always comes to the same worker
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        slot, camera_id, frame_seq = task
+        try:
+            timings = {}
+            start = time.perf_counter()
+            seq, jpeg = ring.read_input(slot)
+            if seq != frame_seq:
+                raise RuntimeError(f"slot {slot} holds frame {seq}, expected {frame_seq}")
+            frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            del jpeg
+            timings["decode"] = [time.perf_counter() - start]
+            if frame is None:
+                raise ValueError("undecodable JPEG")
+            state = states.get(camera_id)
+            if state is None:
+                state = states[camera_id] = fall_detection_1.DetectionState()
+            fall_detected, _ = fall_detection_1.process_frame(frame, state, timings=timings, annotate=False)
+            metadata = fall_detection_1.detection_metadata(state, frame)
+            gate = state.motion_gate
+            results.put(("result", index, slot, frame_seq, fall_detected, state.last_overlays,
+                         state.fallen_people, metadata,
+                         (gate.frames_analysed, gate.frames_skipped),
+                         {stage: values[0] for stage, values in timings.items()}))
+        except Exception as e:
+            results.put(("error", index, slot, frame_seq, f"{type(e).__name__}: {e}"))
+
+# =================================================================
+# Section 3: Parent-Side Pool
+# =================================================================
+class WorkerHandle:
+    """Parent-side view of one worker: its process, slot ring, task queue and free slots."""
+    def __init__(self, index, context, results, queue_class, slots, slot_bytes):
+        self.index = index
+        self.ring = FrameSlotRing(slots, slot_bytes)
+        self.tasks = context.Queue()
+        self.pending = queue_class(f"worker{index}")
+        self.process = context.Process(target=worker_main, name=f"inference-worker-{index}", daemon=True,
+                                       args=(index, self.ring.name, slots, slot_bytes, self.tasks, results))
+        self.cameras = 0
+        self.exited = False
+        self.in_flight = {}            # slot -> (camera, captured_at, jpeg)
+        self._free = list(range(slots))
+        self._cond = threading.Condition()
+
+    def acquire_slot(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._free)
+            return self._free.pop()
+
+    def release_slot(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
+
+    def hand_over(self, slot, camera, captured_at, jpeg):
+        """Records a frame written to slot; False (and the slot freed) if the worker has exited meanwhile."""
+        with self._cond:
+            if self.exited:
+                self._free.append(slot)
+                return False
+            self.in_flight[slot] = (camera, captured_at, jpeg)
+            return True
+
+    def retire(self):
+        """Marks the worker gone and frees the slots of frames it will never answer."""
+        with self._cond:
+            self.exited = True
+            self._free.extend(self.in_flight)
+            self.in_flight.clear()
+            self._cond.notify_all()
+
+class InferenceWorkerPool:
+    """
+    Routes frames of each camera to one worker process and reports results.
+    on_result(camera, frame_seq, captured_at, jpeg, fall_detected, overlays,
+    fallen_people, metadata, gate_counts, timings) and on_status(index, state, error, load_seconds,
+    warmup_seconds) run on the pool's result thread. queue_class builds the per-worker pending queue; it
+    needs put(key, item), get(), qsize() and a name.
+    """
+    def __init__(self, workers, on_result, on_status, queue_class,
+                 slots=SLOTS_PER_WORKER, slot_bytes=SLOT_BYTES):
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.slot_bytes = slot_bytes
+        self.on_result = on_result
+        self.on_status = on_status
+        self.workers = [WorkerHandle(i, context, self.results, queue_class, slots, slot_bytes)
+                        for i in range(workers)]
+        self.assignments = {}          # camera_id -> WorkerHandle
+        self.oversized = 0             # frames too large for a slot
+        self._lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            worker.process.start()
+            threading.Thread(target=self._dispatch, args=(worker,), name=f"dispatch-{worker.index}",
+                             daemon=True).start()
+        threading.Thread(target=self._collect, name="inference-results", daemon=True).start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.exited = True
+            worker.tasks.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            worker.ring.close(unlink=True)
+
+    def _check_workers(self):
+        """Reports a worker that died (crash, OOM kill) once as failed."""
+        for worker in self.workers:
+            if not worker.exited and worker.process.exitcode is not None:
+                self._retire(worker)
+                self.on_status(worker.index, "failed", f"exited with code {worker.process.exitcode}", None, None)
+
+    def _retire(self, worker):
+        """Takes a failed worker out of rotation; its cameras are assigned again on their next frame."""
+        worker.retire()
+        with self._lock:
+            self.assignments = {camera_id: assigned for camera_id, assigned in self.assignments.items()
+                                if assigned is not worker}
+            worker.cameras = 0
+
+    def queues(self):
+        return [worker.pending for worker in self.workers]
+
+    def worker_for(self, camera_id):
+        """The camera's worker, or None once every worker has failed."""
+        with self._lock:
+            worker = self.assignments.get(camera_id)
+            if worker is None:
+                alive = [w for w in self.workers if not w.exited]
+                if not alive:
+                    return None
+                worker = min(alive, key=lambda w: w.cameras)
+                worker.cameras += 1
+                self.assignments[camera_id] = worker
+            return worker
+
+    def submit(self, camera, frame_seq, captured_at, jpeg):
+        """Queues a received JPEG for the camera's worker; a newer frame replaces one still waiting."""
+        if len(jpeg) > self.slot_bytes:
+            if not self.oversized:
+                print(f"[!] Frame of camera '{camera.camera_id}' ({len(jpeg)} bytes) is larger than an inference "
+                      f"slot ({self.slot_bytes} bytes); such frames skip fall detection")
+            self.oversized += 1
+            return
+        worker = self.worker_for(camera.camera_id)
+        if worker is not None:
+            worker.pending.put(camera.camera_id, (camera, frame_seq, captured_at, jpeg))
+
+    def _dispatch(self, worker):
+        while True:
+            # Wait for a slot first, so the frame taken afterwards is the freshest one
+            slot = worker.acquire_slot()
+            camera, frame_seq, captured_at, jpeg = worker.pending.get()
+            if worker.exited:
+                # Queued before the worker failed; send it to the camera's new worker
+                worker.release_slot(slot)
+                self.submit(camera, frame_seq, captured_at, jpeg)
+                continue
+            worker.ring.write_input(slot, frame_seq, jpeg)
+            if worker.hand_over(slot, camera, captured_at, jpeg):
+                worker.tasks.put((slot, camera.camera_id, frame_seq))
+
+    def _collect(self):
+        # Checked on a timer, not only when results stop: a busy pool must notice a dead worker too
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        while True:
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+                self._check_workers()
+            try:
+                message = self.results.get(timeout=max(0.0, next_check - time.monotonic()))
+            except queue.Empty:
+                continue
+            kind, index = message[0], message[1]
+            worker = self.workers[index]
+            if kind == "status":
+                if message[2] == "failed":   # a failed worker exits on its own
+                    self._retire(worker)
+                self.on_status(index, *message[2:])
+                continue
+            slot, frame_seq = message[2], message[3]
+            entry = worker.in_flight.pop(slot, None)
+            if entry is None:
+                continue
+            camera, captured_at, jpeg = entry
+            worker.release_slot(slot)
+            if kind == "error":
+                print(f"[!] Inference worker {index} failed on camera '{camera.camera_id}': {message[4]}")
+                continue
+            try:
+                self.on_result(camera, frame_seq, captured_at, jpeg, *message[4:])
+            except Exception as e:
+                print(f"[!] Error handling inference result of camera '{camera.camera_id}': {e}")
+                traceback.print_exc()
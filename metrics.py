@@ -0,0 +1,216 @@
+"""
+Small metrics layer shared by sender.py, backend_server.py and
+fall_detection.py, rendered in the Prometheus text format by the backend's
+/metrics endpoint. No client library is needed.
+
+    FRAMES = counter("frames_received_total", "Frames received", ("camera",))
+    FRAMES.labels("cam1").inc()
+    with histogram("decode_seconds", "JPEG decode time").time():
+        ...
+
+Values that already live elsewhere (queue lengths, viewer counts) are read
+only when scraped, through gauge_callback().
+
+Debug output is level-gated: call sites check DEBUG_LOGGING before building
+the message, so it costs one global lookup when off. Turn it on with the
+environment variable LOG_LEVEL=DEBUG.
+"""
+import bisect
+import os
+import threading
+import time
+
+DEBUG_LOGGING = os.environ.get("LOG_LEVEL", "INFO").upper() == "DEBUG"
+
+# Seconds; covers a fast JPEG decode up to a badly overloaded pipeline
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# =================================================================
+# Section 1: Metric Types
+# =================================================================
+class Counter:
+    """Monotonically increasing value."""
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name):
+        return [(name, (), self.value)]
+
+class Gauge:
+    """Value that can go up and down."""
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        return [(name, (), self.value)]
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds spent inside it."""
+        return Timer(self)
+
+    def samples(self, name):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((name + "_bucket", (("le", format_value(bound)),), cumulative))
+        samples.append((name + "_sum", (), total))
+        samples.append((name + "_count", (), count))
+        return samples
+
+class MetricFamily:
+    """A named metric, either unlabelled or with one child per combination of label values."""
+    def __init__(self, name, help_text, kind, label_names, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._children[()] = factory()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self):
+        """[(label values, child)] of every child created so far."""
+        return list(self._children.items())
+
+    # Unlabelled families can be used like their only child
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def samples(self):
+        for values, child in self.children():
+            for name, extra, value in child.samples(self.name):
+                yield name, tuple(zip(self.label_names, values)) + extra, value
+
+class CallbackFamily:
+    """A metric whose samples are computed at scrape time by fn() -> [(label values, value)]."""
+    def __init__(self, name, help_text, kind, label_names, fn):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.fn = fn
+
+    def samples(self):
+        for values, value in self.fn():
+            yield self.name, tuple(zip(self.label_names, (str(v) for v in values))), value
+
+# =================================================================
+# Section 2: Registry and Text Format
+# =================================================================
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, make):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = make()
+            return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(name, lambda: MetricFamily(name, help_text, "counter", label_names, Counter))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(name, lambda: MetricFamily(name, help_text, "gauge", label_names, Gauge))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(name, lambda: MetricFamily(name, help_text, "histogram", label_names,
+                                                          lambda: Histogram(buckets)))
+
+    def gauge_callback(self, name, help_text, fn, label_names=(), kind="gauge"):
+        """Registers (or replaces) a metric computed by fn when scraped. kind may be "counter"."""
+        with self._lock:
+            self._families[name] = CallbackFamily(name, help_text, kind, label_names, fn)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help_text}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labels, value in family.samples():
+                if labels:
+                    label_text = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels)
+                    lines.append(f"{name}{{{label_text}}} {format_value(value)}")
+                else:
+                    lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+gauge_callback = REGISTRY.gauge_callback
+render = REGISTRY.render
@@ -1,7 +1,13 @@
+import argparse
 import cv2
+import numpy as np
+import select
 import socket
-import struct
+import threading
 import time
+from metrics import DEBUG_LOGGING, counter, histogram
+from stream_protocol import (CAP_ACK, PROTOCOL_VERSION, WELCOME_SIZE, FeedbackReader, encode_camera_id, pack_frame,
+                             pack_frame_v2, pack_heartbeat, pack_hello, parse_welcome)
 
 # =================================================================
 # Section 1: Configuration Parameters
@@ -9,25 +15,82 @@ import time
 SERVER_IP = 'change to your vpn ip'  # Virtual Machine Tailscale IP
 SERVER_PORT = 9999                   # Server port
 RECONNECT_DELAY = 5                  # Delay for reconnect attempts (seconds)
-JPEG_QUALITY = 70                    # JPEG compression quality (0-100)
+JPEG_QUALITY = 70                    # JPEG compression quality (0-100); the adaptive upper bound
 RESIZE_WIDTH = 640                   # Target width for image resizing (0 means no resize)
+TARGET_FPS = 30                      # Frame rate when the link and backend keep up
+CAMERA_ID = socket.gethostname()     # Name of this camera on the backend (must be unique per sender)
+WIRE_PROTOCOL = PROTOCOL_VERSION     # 2: sequence numbers, capture timestamps and acks; 1 for backends without v2
+HEARTBEAT_INTERVAL = 2.0             # Send a heartbeat when no frame went out for this long (v2)
+ACK_TIMEOUT = 10.0                   # Reconnect when the backend sent nothing for this long (v2)
+WELCOME_TIMEOUT = 5.0                # Seconds to wait for the backend's answer to the hello (v2)
+CAMERA_INDEX = 0                     # V4L2 device index passed to cv2.VideoCapture
+CAPTURE_MJPEG = False                # Ask the camera for MJPEG and send its JPEGs as-is (no re-encode on the Pi)
+CAPTURE_WIDTH = RESIZE_WIDTH or 640  # Resolution requested from the camera in MJPEG mode
+CAPTURE_HEIGHT = CAPTURE_WIDTH * 3 // 4
+
+# Adaptive streaming: lower quality, then resolution, then frame rate when the link or backend falls behind
+MIN_JPEG_QUALITY = 35                # Lowest JPEG quality used under congestion
+QUALITY_STEP = 10                    # Quality change per adjustment
+MIN_RESIZE_WIDTH = 320               # Smallest width used under congestion
+MIN_FPS = 5                          # Lowest frame rate used under congestion
+ADJUST_INTERVAL = 1.0                # Seconds between adjustments
+SEND_BUDGET = 0.5                    # Congested when sendall takes more than this share of the frame interval
+FPS_HEADROOM = 1.5                   # Send at most this multiple of the backend's inference rate
+SEND_BUFFER_BYTES = 256 * 1024       # Small kernel send buffer so stale frames cannot pile up in it
+STATS_INTERVAL = 10.0                # Seconds between stage timing summaries when LOG_LEVEL=DEBUG
+
+STAGE_SECONDS = histogram("sender_stage_seconds", "Time spent in each sender stage", ("stage",))
+FRAMES_SENT = counter("sender_frames_sent_total", "Frames sent to the backend")
+BYTES_SENT = counter("sender_bytes_sent_total", "JPEG bytes sent to the backend")
+ACK_SECONDS = histogram("sender_ack_latency_seconds", "Time from capturing a frame to receiving its ack (v2)")
 
 # =================================================================
 # Section 2: Establishing Connection to the Server
 # =================================================================
 def connect_to_server():
-    """Continuously attempts to connect to the backend server."""
+    """
+    Continuously attempts to connect to the backend server. Returns
+    (socket, last sequence number the backend has for this camera); the
+    sequence number is None with protocol v1.
+    """
     while True:
+        client_socket = None
         try:
             client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
             print(f"[INFO] Attempting to connect to {SERVER_IP}:{SERVER_PORT} ...")
             client_socket.connect((SERVER_IP, SERVER_PORT))
-            print("[INFO] Successfully connected to the server!")
-            return client_socket
+            last_seq = None
+            if WIRE_PROTOCOL >= 2:
+                client_socket.sendall(pack_hello(CAMERA_ID, WIRE_PROTOCOL, CAP_ACK))
+                last_seq = read_welcome(client_socket)
+            else:
+                client_socket.sendall(pack_hello(CAMERA_ID))
+            print(f"[INFO] Successfully connected to the server as camera '{CAMERA_ID}'!")
+            return client_socket, last_seq
         except socket.error as e:
+            if client_socket is not None:
+                client_socket.close()
             print(f"[ERROR] Connection failed: {e}. Retrying in {RECONNECT_DELAY} seconds...")
             time.sleep(RECONNECT_DELAY)
 
+def read_welcome(client_socket):
+    """Waits for the backend's welcome and returns the last sequence number it has for this camera."""
+    client_socket.settimeout(WELCOME_TIMEOUT)
+    data = b""
+    try:
+        while len(data) < WELCOME_SIZE:
+            packet = client_socket.recv(WELCOME_SIZE - len(data))
+            if not packet:
+                raise ConnectionResetError("Server closed the connection during the handshake")
+            data += packet
+    except socket.timeout:
+        raise ConnectionError("No welcome from the server; set WIRE_PROTOCOL = 1 for backends without protocol v2")
+    finally:
+        client_socket.settimeout(None)
+    _, _, last_seq = parse_welcome(data)
+    return last_seq
+
 # =================================================================
 # Section 3: Frame Resizing Function
 # =================================================================
@@ -40,64 +103,425 @@ def resize_frame(frame, target_width):
     return frame
 
 # =================================================================
-# Section 4: Main Processing Loop
+# Section 4: Adaptive Quality, Resolution and Frame Rate
 # =================================================================
-def main():
-    client_socket = None
+def width_steps(max_width):
+    """Resize widths from normal down to MIN_RESIZE_WIDTH (0 = no resize comes first)."""
+    steps = [max_width] if max_width else [0, 640]
+    width = steps[-1]
+    while width > MIN_RESIZE_WIDTH:
+        width = max(MIN_RESIZE_WIDTH, width * 3 // 4)
+        steps.append(width)
+    return steps
+
+class AdaptiveController:
+    """
+    Picks JPEG quality, resize width and frame rate from what the backend
+    reports (receive and inference rate) and from how long sendall() takes
+    here. Under congestion it steps quality down first, then resolution,
+    then frame rate, and recovers in the reverse order once things are calm.
+    """
+    RECOVERY_INTERVALS = 3   # Calm adjustment intervals needed before stepping back up
+
+    def __init__(self):
+        self.quality = JPEG_QUALITY
+        self.widths = width_steps(RESIZE_WIDTH)
+        self.width_index = 0
+        self.level_fps = TARGET_FPS
+        self.fps_cap = TARGET_FPS
+        self.feedback = None
+        self.feedback_time = 0.0
+        self.send_time_avg = 0.0
+        self._frames_sent = 0
+        self._calm_intervals = 0
+        self._last_adjust = time.monotonic()
+
+    @property
+    def width(self):
+        return self.widths[self.width_index]
+
+    @property
+    def target_fps(self):
+        return min(self.level_fps, self.fps_cap)
+
+    def on_frame_sent(self, send_seconds):
+        self.send_time_avg = 0.8 * self.send_time_avg + 0.2 * send_seconds
+        self._frames_sent += 1
+
+    def on_feedback(self, feedback):
+        self.feedback = feedback
+        self.feedback_time = time.monotonic()
+
+    def update(self, now):
+        """Adjusts the settings once per ADJUST_INTERVAL."""
+        elapsed = now - self._last_adjust
+        if elapsed < ADJUST_INTERVAL:
+            return
+        sent_fps = self._frames_sent / elapsed
+        self._frames_sent = 0
+        self._last_adjust = now
+
+        congested = self.send_time_avg > SEND_BUDGET / self.target_fps
+        self.fps_cap = TARGET_FPS
+        if self.feedback is not None and now - self.feedback_time < 3 * ADJUST_INTERVAL:
+            recv_fps, infer_fps, _ = self.feedback
+            # Frames sent but not yet received are sitting in a queue somewhere
+            congested = congested or recv_fps < 0.8 * sent_fps
+            if infer_fps > 0:
+                self.fps_cap = min(TARGET_FPS, max(MIN_FPS, infer_fps * FPS_HEADROOM))
+
+        before = (self.quality, self.width, self.level_fps)
+        if congested:
+            self._calm_intervals = 0
+            self._step_down()
+        else:
+            self._calm_intervals += 1
+            if self._calm_intervals >= self.RECOVERY_INTERVALS:
+                self._calm_intervals = 0
+                self._step_up()
+        if (self.quality, self.width, self.level_fps) != before:
+            print(f"[INFO] {'Congested' if congested else 'Recovered'}: quality={self.quality} "
+                  f"width={self.width} fps={self.target_fps:.0f} (send {self.send_time_avg * 1000:.0f} ms/frame)")
+
+    def _step_down(self):
+        if self.quality > MIN_JPEG_QUALITY:
+            self.quality = max(MIN_JPEG_QUALITY, self.quality - QUALITY_STEP)
+        elif self.width_index < len(self.widths) - 1:
+            self.width_index += 1
+        elif self.level_fps > MIN_FPS:
+            self.level_fps = max(MIN_FPS, self.level_fps / 2)
+
+    def _step_up(self):
+        if self.level_fps < TARGET_FPS:
+            self.level_fps = min(TARGET_FPS, self.level_fps * 2)
+        elif self.width_index > 0:
+            self.width_index -= 1
+        elif self.quality < JPEG_QUALITY:
+            self.quality = min(JPEG_QUALITY, self.quality + QUALITY_STEP)
+
+def poll_feedback(client_socket, feedback_reader, controller):
+    """Reads any feedback and acks the backend sent, without blocking. Returns True if anything arrived."""
+    readable, _, _ = select.select([client_socket], [], [], 0)
+    if not readable:
+        return False
+    data = client_socket.recv(4096)
+    if not data:
+        raise ConnectionResetError("Server closed the connection")
+    feedback = feedback_reader.feed(data)
+    if feedback is not None:
+        controller.on_feedback(feedback)
+    now = time.time()
+    for _, capture_time in feedback_reader.take_acks():
+        ACK_SECONDS.observe(max(0.0, now - capture_time))
+    return True
+
+# =================================================================
+# Section 5: Capture Thread
+# =================================================================
+class LatestFrameSlot:
+    """
+    One-slot hand-off from the capture thread to the encode/send loop.
+    A new frame replaces one that was not taken yet, so the sender always
+    works on the freshest frame and stale frames never queue up.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.captured = 0
+        self.dropped = 0
+        self.finished = False
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.captured += 1
+            self._cond.notify()
+
+    def take(self, timeout):
+        """Returns the newest (frame, is_jpeg, read_seconds, capture_time) item, or None if none arrived within timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self.finished, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def finish(self):
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+class SyntheticSource:
+    """Stand-in for cv2.VideoCapture: a moving box on a noisy background at a fixed frame rate."""
+    def __init__(self, width, height, fps, mjpeg):
+        rng = np.random.default_rng(0)
+        background = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        self.frames = []
+        for i in range(30):
+            frame = background.copy()
+            x = (i * width // 30) % max(1, width - 100)
+            cv2.rectangle(frame, (x, height // 3), (x + 100, height // 3 + 150), (0, 255, 0), -1)
+            if mjpeg:
+                # Pre-encoded, like the JPEGs a camera's hardware encoder would hand over
+                frame = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])[1].reshape(1, -1)
+            self.frames.append(frame)
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.next_time = time.perf_counter()
+        self.index = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.interval:
+            self.next_time += self.interval
+            time.sleep(max(0.0, self.next_time - time.perf_counter()))
+        self.index += 1
+        return True, self.frames[self.index % len(self.frames)]
+
+    def get(self, prop):
+        return 1.0 / self.interval if self.interval and prop == cv2.CAP_PROP_FPS else 0.0
+
+    def release(self):
+        pass
+
+def open_capture(source, mjpeg, source_fps=0):
+    """Opens a camera index, a video file or "synthetic"."""
+    if source == "synthetic":
+        return SyntheticSource(CAPTURE_WIDTH, CAPTURE_HEIGHT, source_fps or TARGET_FPS, mjpeg)
+    if isinstance(source, int):
+        vid = cv2.VideoCapture(source, cv2.CAP_V4L2) if mjpeg else cv2.VideoCapture(source)
+        vid.set(cv2.CAP_PROP_BUFFERSIZE, 1)   # The driver should not hold on to old frames either
+        if mjpeg:
+            vid.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+            vid.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+            vid.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+            # Hand over the compressed JPEG instead of decoding it to BGR
+            vid.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        return vid
+    return cv2.VideoCapture(source)
+
+def is_jpeg_buffer(frame):
+    """True for the 1-row byte buffers V4L2 returns in MJPEG mode with CONVERT_RGB off."""
+    return (frame.ndim == 1 or frame.shape[0] == 1) and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8
+
+def capture_loop(source, slot, stop, mjpeg=CAPTURE_MJPEG, source_fps=0, end_of_stream_stops=False):
+    """Reads frames as fast as the source delivers them and keeps only the newest in slot."""
     vid = None
+    interval = 0.0
+    next_time = 0.0
+    while not stop.is_set():
+        if vid is None or not vid.isOpened():
+            print("[INFO] Opening the camera...")
+            vid = open_capture(source, mjpeg, source_fps)
+            if not vid.isOpened():
+                print("[ERROR] Unable to open camera. Check connection and permissions.")
+                vid = None
+                time.sleep(RECONNECT_DELAY)
+                continue
+            print("[INFO] Camera successfully opened.")
+            # Video files are replayed at their own frame rate, like a camera would deliver them
+            if isinstance(source, str) and source != "synthetic":
+                fps = source_fps or vid.get(cv2.CAP_PROP_FPS)
+                interval = 1.0 / fps if fps > 0 else 0.0
+            next_time = time.perf_counter()
+
+        read_start = time.perf_counter()
+        ret, frame = vid.read()
+        capture_time = time.time()
+        read_seconds = time.perf_counter() - read_start
+        if not ret:
+            vid.release()
+            vid = None
+            if end_of_stream_stops:
+                break
+            print("[WARNING] Unable to read frame. Possible camera disconnection.")
+            time.sleep(1)
+            continue
+        slot.put((frame, is_jpeg_buffer(frame), read_seconds, capture_time))
+        if interval:
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    if vid is not None:
+        vid.release()
+        print("[INFO] Camera released.")
+    slot.finish()
+
+# =================================================================
+# Section 6: Frame Encoding
+# =================================================================
+def encode_frame(frame, is_jpeg, controller, timings=None):
+    """
+    Returns the JPEG bytes to send for a captured frame, or None on failure.
+    Camera MJPEG frames are forwarded untouched unless the controller asks for
+    lower quality or resolution, in which case they are decoded and re-encoded.
+    """
+    if is_jpeg:
+        if controller.quality >= JPEG_QUALITY and controller.width_index == 0:
+            return frame.tobytes()
+        start = time.perf_counter()
+        frame = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_COLOR)
+        record_timing(timings, "decode", start)
+        if frame is None:
+            return None
+
+    # Resize frame if necessary
+    start = time.perf_counter()
+    frame = resize_frame(frame, controller.width)
+    record_timing(timings, "resize", start)
+
+    # Encode frame as JPEG
+    start = time.perf_counter()
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), controller.quality]
+    result, frame_encoded = cv2.imencode('.jpg', frame, encode_param)
+    record_timing(timings, "encode", start)
+    if not result:
+        print("[ERROR] JPEG encoding failed.")
+        return None
+    return frame_encoded.tobytes()
+
+def record_timing(timings, stage, start):
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    if timings is not None:
+        timings.setdefault(stage, []).append(elapsed)
+
+class StatsLogger:
+    """Prints mean stage times and rates since the last summary. Only used with LOG_LEVEL=DEBUG."""
+    def __init__(self, slot):
+        self.slot = slot
+        self.last_time = time.monotonic()
+        self.next_time = self.last_time + STATS_INTERVAL
+        self.last = self._snapshot()
+
+    def _snapshot(self):
+        stages = {stage: (child.sum, child.count) for (stage,), child in STAGE_SECONDS.children()}
+        return stages, FRAMES_SENT.labels().value, BYTES_SENT.labels().value, self.slot.dropped
+
+    def maybe_log(self, now, controller):
+        if now < self.next_time:
+            return
+        elapsed = max(now - self.last_time, 1e-3)
+        self.last_time = now
+        self.next_time = now + STATS_INTERVAL
+        current = self._snapshot()
+        (last_stages, last_frames, last_bytes, last_dropped), self.last = self.last, current
+        stages, frames, sent_bytes, dropped = current
+        parts = []
+        for stage, (total, count) in stages.items():
+            last_total, last_count = last_stages.get(stage, (0.0, 0))
+            if count > last_count:
+                parts.append(f"{stage}={1000 * (total - last_total) / (count - last_count):.1f}ms")
+        print(f"[DEBUG] {(frames - last_frames) / elapsed:.1f} FPS, "
+              f"{(sent_bytes - last_bytes) * 8 / 1000 / elapsed:.0f} kbit/s, "
+              f"{dropped - last_dropped} frames replaced before sending, quality={controller.quality} "
+              f"width={controller.width}; {' '.join(parts)}")
+
+# =================================================================
+# Section 7: Main Processing Loop
+# =================================================================
+class FrameLink:
+    """
+    The sender's side of one camera stream: packs frames for the negotiated
+    protocol and keeps the v2 sequence number across reconnects.
+    """
+    def __init__(self, camera_id=None):
+        self.camera_id = encode_camera_id(camera_id or CAMERA_ID)
+        self.seq = 0                 # sequence number of the last frame sent
+        self.version = 1
+        self.last_send = 0.0
+        self.last_heard = 0.0        # last time anything arrived from the backend
+
+    def connected(self, last_seq):
+        """Call with what connect_to_server() returned."""
+        self.version = 1 if last_seq is None else 2
+        self.last_send = self.last_heard = time.monotonic()
+        if last_seq is None:
+            return
+        if last_seq > self.seq:
+            # This sender restarted; continue the backend's numbering so gaps stay meaningful
+            self.seq = last_seq
+        elif 0 < last_seq < self.seq:
+            # 0 means a restarted backend that has not seen this camera yet
+            print(f"[INFO] {self.seq - last_seq} frame(s) sent before reconnecting never reached the server")
+
+    def send_frame(self, client_socket, data, capture_time):
+        self.seq += 1
+        if self.version >= 2:
+            client_socket.sendall(pack_frame_v2(self.camera_id, self.seq, capture_time, data))
+        else:
+            client_socket.sendall(pack_frame(data))
+        self.last_send = time.monotonic()
+
+    def keep_alive(self, client_socket, feedback_reader, controller):
+        """Sends a heartbeat when idle and raises when a v2 backend stopped answering."""
+        now = time.monotonic()
+        if poll_feedback(client_socket, feedback_reader, controller):
+            self.last_heard = now
+        if self.version < 2:
+            return
+        if now - self.last_send >= HEARTBEAT_INTERVAL:
+            client_socket.sendall(pack_heartbeat(self.camera_id, self.seq, time.time()))
+            self.last_send = now
+        if now - self.last_heard > ACK_TIMEOUT:
+            raise ConnectionResetError(f"No answer from the server for {ACK_TIMEOUT:.0f}s")
+
+def main(source=CAMERA_INDEX, mjpeg=CAPTURE_MJPEG):
+    client_socket = None
+    controller = AdaptiveController()
+    feedback_reader = None
+    link = FrameLink()
+    slot = LatestFrameSlot()
+    stop = threading.Event()
+    capture_thread = threading.Thread(target=capture_loop, args=(source, slot, stop, mjpeg), daemon=True)
+    capture_thread.start()
+    stats = StatsLogger(slot) if DEBUG_LOGGING else None
     while True:
         try:
             # Ensure valid socket connection
             if client_socket is None or client_socket.fileno() == -1:
                 if client_socket:
                     client_socket.close()
-                client_socket = connect_to_server()
-
-            # Ensure the camera is opened
-            if vid is None or not vid.isOpened():
-                print("[INFO] Opening the camera...")
-                vid = cv2.VideoCapture(0)
-                if not vid.isOpened():
-                    print("[ERROR] Unable to open camera. Check connection and permissions.")
-                    time.sleep(RECONNECT_DELAY)
-                    continue
-                print("[INFO] Camera successfully opened.")
-
-            # Read frame from the camera
-            ret, frame = vid.read()
-            if not ret:
-                print("[WARNING] Unable to read frame. Possible camera disconnection.")
-                vid.release()
-                vid = None
-                time.sleep(1)
-                continue
+                client_socket, last_seq = connect_to_server()
+                link.connected(last_seq)
+                feedback_reader = FeedbackReader()
 
-            # Resize frame if necessary
-            frame = resize_frame(frame, RESIZE_WIDTH)
+            # Take the newest frame from the capture thread
+            item = slot.take(timeout=1.0)
+            if item is None:
+                link.keep_alive(client_socket, feedback_reader, controller)
+                continue
+            frame_start = time.perf_counter()
+            frame, is_jpeg, _, capture_time = item
 
-            # Encode frame as JPEG
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-            result, frame_encoded = cv2.imencode('.jpg', frame, encode_param)
-            if not result:
-                print("[ERROR] JPEG encoding failed.")
+            data = encode_frame(frame, is_jpeg, controller)
+            if data is None:
                 continue
 
-            # Send data: first the 4-byte length, then the JPEG bytes
-            data = frame_encoded.tobytes()
-            size = len(data)
-            client_socket.sendall(struct.pack(">L", size) + data)
+            # Send data: the frame header (length, or the v2 header), then the JPEG bytes
+            send_start = time.perf_counter()
+            link.send_frame(client_socket, data, capture_time)
+            send_seconds = time.perf_counter() - send_start
+            controller.on_frame_sent(send_seconds)
+            STAGE_SECONDS.labels("send").observe(send_seconds)
+            FRAMES_SENT.inc()
+            BYTES_SENT.inc(len(data))
+            if stats is not None:
+                stats.maybe_log(time.monotonic(), controller)
 
-            # Control the frame rate (~30 FPS)
-            time.sleep(0.03)
+            # Adapt to what the link and the backend can absorb
+            link.keep_alive(client_socket, feedback_reader, controller)
+            controller.update(time.monotonic())
 
-        except (socket.error, ConnectionResetError, BrokenPipeError) as e:
+            # Control the frame rate
+            time.sleep(max(0.0, 1.0 / controller.target_fps - (time.perf_counter() - frame_start)))
+
+        except (socket.error, ConnectionError) as e:
             print(f"[ERROR] Socket error: {e}. Reconnecting...")
             if client_socket:
                 client_socket.close()
             client_socket = None
-            if vid and vid.isOpened():
-                vid.release()
-                vid = None
             time.sleep(RECONNECT_DELAY / 2)
 
         except KeyboardInterrupt:
@@ -109,23 +533,94 @@ def main():
             if client_socket:
                 client_socket.close()
             client_socket = None
-            if vid and vid.isOpened():
-                vid.release()
-                vid = None
             time.sleep(RECONNECT_DELAY)
 
     # =================================================================
-    # Section 5: Resource Cleanup
+    # Section 8: Resource Cleanup
     # =================================================================
     print("[INFO] Cleaning up resources...")
-    if vid and vid.isOpened():
-        vid.release()
-        print("[INFO] Camera released.")
+    stop.set()
+    capture_thread.join(timeout=2.0)
     if client_socket:
         client_socket.close()
         print("[INFO] Socket connection closed.")
     cv2.destroyAllWindows()
     print("[INFO] Program terminated.")
 
+# =================================================================
+# Section 9: Bench Mode
+# =================================================================
+def run_bench(source, frames, mjpeg, source_fps):
+    """
+    Runs capture -> encode -> send against a local socket instead of the
+    backend and reports per-stage timings and the achieved frame rate.
+    Works with a video file or the synthetic source, no camera needed.
+    """
+    slot = LatestFrameSlot()
+    stop = threading.Event()
+    capture_thread = threading.Thread(target=capture_loop, daemon=True,
+                                      args=(source, slot, stop, mjpeg, source_fps, True))
+    rx, tx = socket.socketpair()
+    tx.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+
+    def drain():
+        while rx.recv(1 << 20):
+            pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    controller = AdaptiveController()
+    timings = {}
+    sent = 0
+    sent_bytes = 0
+    capture_thread.start()
+    start = time.perf_counter()
+    while sent < frames:
+        item = slot.take(timeout=5.0)
+        if item is None:
+            break
+        frame, is_jpeg, read_seconds, _ = item
+        timings.setdefault("capture", []).append(read_seconds)
+        data = encode_frame(frame, is_jpeg, controller, timings)
+        if data is None:
+            continue
+        send_start = time.perf_counter()
+        tx.sendall(pack_frame(data))
+        record_timing(timings, "send", send_start)
+        sent += 1
+        sent_bytes += len(data)
+    wall = time.perf_counter() - start
+    stop.set()
+    capture_thread.join(timeout=2.0)
+    tx.close()
+    rx.close()
+
+    print(f"source={source} mjpeg={'on' if mjpeg else 'off'} quality={controller.quality} width={controller.width}")
+    print(f"{'stage':<10}{'frames':>8}{'mean ms':>10}{'p95 ms':>10}")
+    serial_ms = 0.0
+    for stage in ("capture", "decode", "resize", "encode", "send"):
+        values = sorted(timings.get(stage, []))
+        if not values:
+            continue
+        mean_ms = 1000 * sum(values) / len(values)
+        serial_ms += mean_ms
+        print(f"{stage:<10}{len(values):>8}{mean_ms:>10.2f}{1000 * values[int(0.95 * (len(values) - 1))]:>10.2f}")
+    print(f"captured {slot.captured} frames, sent {sent} ({slot.dropped} replaced before sending)")
+    print(f"achieved {sent / wall:.1f} FPS, {sent_bytes / max(sent, 1) / 1024:.1f} KB/frame; "
+          f"a single-threaded loop would be capped near {1000 / serial_ms if serial_ms else 0:.1f} FPS")
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Raspberry Pi camera sender")
+    parser.add_argument("--source", default=str(CAMERA_INDEX),
+                        help="Camera index, video file or 'synthetic' (default: %(default)s)")
+    parser.add_argument("--mjpeg", action="store_true", default=CAPTURE_MJPEG,
+                        help="Request MJPEG from the camera and forward it without re-encoding")
+    parser.add_argument("--bench", action="store_true", help="Measure per-stage timings without a backend")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to send in bench mode")
+    parser.add_argument("--source-fps", type=float, default=0,
+                        help="Frame rate of a file/synthetic source (default: the file's own, or TARGET_FPS)")
+    args = parser.parse_args()
+    source = int(args.source) if args.source.isdigit() else args.source
+    if args.bench:
+        run_bench(source, args.frames, args.mjpeg, args.source_fps)
+    else:
+        main(source, args.mjpeg)
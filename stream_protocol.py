@@ -0,0 +1,330 @@
+"""
+Wire format shared by sender.py (Raspberry Pi) and backend_server.py (VM).
+
+Protocol v1: every frame is sent as a 4-byte big-endian length followed by
+the JPEG bytes. Right after connecting, a sender announces which camera it is
+with a hello message so the backend can keep one stream per camera:
+
+    b"CAM1" | 1-byte id length | camera id (UTF-8)
+
+Senders that send the hello also read feedback from the backend on the same
+socket (see Section 4). Senders that skip the hello (older sender.py
+versions) are still accepted and get no feedback;
+the backend then names the stream after the sender's IP address. Telling the
+two apart is unambiguous: read as a legacy length prefix, b"CAM1" would be a
+~1.1 GB frame, which no sender produces.
+
+Protocol v2 (Section 5) starts with a b"CAM2" hello instead. The backend
+answers with a welcome carrying the last sequence number it has for the
+camera, and from then on every message has a fixed header with magic,
+version, kind (frame or heartbeat), codec, sequence number, capture
+timestamp and the camera ID. Senders that ask for it get an ack per read
+batch, echoing the newest sequence number and its capture time. The backend
+tells v1 and v2 apart by the hello, so both keep working side by side.
+"""
+import struct
+from collections import namedtuple
+
+# =================================================================
+# Section 1: Frame Header
+# =================================================================
+FRAME_HEADER_FORMAT = ">L"
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT)
+
+
+def pack_frame(jpeg_bytes):
+    """Returns the length-prefixed frame ready for sendall()."""
+    return struct.pack(FRAME_HEADER_FORMAT, len(jpeg_bytes)) + jpeg_bytes
+
+
+# =================================================================
+# Section 2: Camera-ID Handshake
+# =================================================================
+HELLO_MAGIC = b"CAM1"
+HELLO_PREFIX_FORMAT = ">4sB"
+HELLO_PREFIX_SIZE = struct.calcsize(HELLO_PREFIX_FORMAT)
+MAX_CAMERA_ID_LENGTH = 255
+
+# v2: b"CAM2" | protocol version | capability flags | 1-byte id length | camera id
+HELLO_V2_MAGIC = b"CAM2"
+HELLO_V2_PREFIX_FORMAT = ">4sBBB"
+HELLO_V2_PREFIX_SIZE = struct.calcsize(HELLO_V2_PREFIX_FORMAT)
+CAP_ACK = 0x01                       # the sender wants an ack for the frames and heartbeats it sends
+
+Hello = namedtuple("Hello", "camera_id consumed version flags")
+
+
+def encode_camera_id(camera_id):
+    encoded = camera_id.encode("utf-8")
+    if not encoded or len(encoded) > MAX_CAMERA_ID_LENGTH:
+        raise ValueError(f"Camera ID must be 1-{MAX_CAMERA_ID_LENGTH} bytes, got {len(encoded)}")
+    return encoded
+
+
+def pack_hello(camera_id, version=1, flags=0):
+    """Builds the hello message announcing camera_id to the backend, for protocol v1 or v2."""
+    encoded = encode_camera_id(camera_id)
+    if version == 1:
+        return struct.pack(HELLO_PREFIX_FORMAT, HELLO_MAGIC, len(encoded)) + encoded
+    return struct.pack(HELLO_V2_PREFIX_FORMAT, HELLO_V2_MAGIC, version, flags, len(encoded)) + encoded
+
+
+def parse_hello(data):
+    """
+    Tries to parse a hello message at the start of data.
+    Returns a Hello (camera_id, consumed_bytes, version, flags) when a complete
+    hello is present, Hello(None, 0, 1, 0) when the stream does not start with
+    a hello (legacy sender), or raises BufferError when more bytes are needed
+    to decide.
+    """
+    if len(data) < len(HELLO_MAGIC):
+        raise BufferError("Need more data")
+    magic = bytes(data[:len(HELLO_MAGIC)])
+    if magic == HELLO_MAGIC:
+        prefix_format, prefix_size = HELLO_PREFIX_FORMAT, HELLO_PREFIX_SIZE
+    elif magic == HELLO_V2_MAGIC:
+        prefix_format, prefix_size = HELLO_V2_PREFIX_FORMAT, HELLO_V2_PREFIX_SIZE
+    else:
+        return Hello(None, 0, 1, 0)
+    if len(data) < prefix_size:
+        raise BufferError("Need more data")
+    fields = struct.unpack(prefix_format, data[:prefix_size])
+    version, flags = (fields[1], fields[2]) if magic == HELLO_V2_MAGIC else (1, 0)
+    end = prefix_size + fields[-1]
+    if len(data) < end:
+        raise BufferError("Need more data")
+    camera_id = bytes(data[prefix_size:end]).decode("utf-8", errors="replace")
+    return Hello(camera_id, end, version, flags)
+
+
+# =================================================================
+# Section 3: Framed Stream Reader
+# =================================================================
+MAX_FRAME_SIZE = 8 * 1024 * 1024     # Largest frame accepted; anything bigger is a corrupt header
+INITIAL_BUFFER_SIZE = 256 * 1024     # Holds a couple of typical 50-150 KB JPEGs
+
+class ProtocolError(ValueError):
+    """Raised when the stream does not follow the protocol, e.g. a corrupt header."""
+
+class FrameTooLargeError(ProtocolError):
+    """Raised when a frame header announces more than max_frame_size bytes."""
+
+class FrameReader:
+    """
+    Reads length-prefixed frames (v1) or v2 messages with recv_into() straight
+    into one reusable bytearray, so bytes are never concatenated or re-sliced
+    per packet. Set version to 2 once the hello said so.
+
+    Frames are handed out as memoryviews into the buffer. A view is only valid
+    until the next recv_from() call; copy it (bytes(view)) to keep it longer.
+    The buffer only grows when a single frame does not fit.
+    """
+    def __init__(self, initial_size=INITIAL_BUFFER_SIZE, max_frame_size=MAX_FRAME_SIZE, version=1):
+        self.version = version
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(initial_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0      # first unconsumed byte
+        self._end = 0        # one past the last received byte
+        self._wanted = 0     # total size of the frame currently being received
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
+
+    def pending(self):
+        """The received but not yet consumed bytes (valid until the next recv_from)."""
+        return self._view[self._start:self._end]
+
+    def consume(self, count):
+        """Drops count bytes from the front of pending(), e.g. after a handshake."""
+        self._start = min(self._start + count, self._end)
+
+    def recv_from(self, sock):
+        """Receives once from sock into the buffer. Returns the byte count (0 means EOF)."""
+        self._prepare_recv()
+        received = sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def next_frame(self):
+        """Returns the payload of the next complete message as a memoryview, or None if more data is needed."""
+        message = self.next_message()
+        return None if message is None else message[1]
+
+    def next_message(self):
+        """
+        Returns (header, payload memoryview) of the next complete message, or
+        None if more data is needed. header is a FrameHeader on v2 streams and
+        None on v1 streams, where every message is a JPEG frame.
+        """
+        available = self._end - self._start
+        if self.version == 1:
+            if available < FRAME_HEADER_SIZE:
+                return None
+            msg_size = struct.unpack_from(FRAME_HEADER_FORMAT, self._buffer, self._start)[0]
+            header_size = FRAME_HEADER_SIZE
+            header = None
+        else:
+            if available < V2_HEADER_SIZE:
+                return None
+            magic, version, kind, codec, id_length, seq, capture_time, msg_size = struct.unpack_from(
+                V2_HEADER_FORMAT, self._buffer, self._start)
+            if magic != V2_MAGIC:
+                raise ProtocolError(f"Expected a v2 message header, got {bytes(magic)!r}")
+            header_size = V2_HEADER_SIZE + id_length
+            header = (kind, codec, seq, capture_time, id_length)
+        if msg_size > self.max_frame_size:
+            raise FrameTooLargeError(f"Frame header announces {msg_size} bytes (limit {self.max_frame_size})")
+        total = header_size + msg_size
+        if available < total:
+            self._wanted = total
+            return None
+        frame_start = self._start + header_size
+        if header is not None:
+            kind, codec, seq, capture_time, id_length = header
+            camera_id = bytes(self._view[frame_start - id_length:frame_start]).decode("utf-8", errors="replace")
+            header = FrameHeader(kind, codec, seq, capture_time, camera_id)
+        self._start += total
+        self._wanted = 0
+        return header, self._view[frame_start:frame_start + msg_size]
+
+    def _prepare_recv(self):
+        """Makes room at the tail of the buffer, compacting or growing only when needed."""
+        pending = self._end - self._start
+        if pending == 0:
+            self._start = self._end = 0
+        needed = max(self._wanted, FRAME_HEADER_SIZE if self.version == 1 else V2_HEADER_SIZE)
+        if needed > len(self._buffer):
+            self._grow(needed)
+            return
+        tail = len(self._buffer) - self._end
+        if self._start > 0 and tail < max(needed - pending, len(self._buffer) // 4):
+            # Move the partial frame to the front; this copies less than one frame.
+            # bytearray slice assignment uses memcpy, so overlapping moves go via a temporary.
+            partial = self._view[self._start:self._end]
+            self._buffer[:pending] = bytes(partial) if pending > self._start else partial
+            self._start, self._end = 0, pending
+
+    def _grow(self, needed):
+        size = len(self._buffer)
+        while size < needed:
+            size *= 2
+        pending = self._end - self._start
+        buffer = bytearray(size)
+        buffer[:pending] = self._view[self._start:self._end]
+        self._buffer, self._view = buffer, memoryview(buffer)
+        self._start, self._end = 0, pending
+
+
+# =================================================================
+# Section 4: Backend -> Sender Feedback
+# =================================================================
+# Sent by the backend about once per second on the sender's own connection:
+#   b"FBK1" | receive FPS | inference FPS | receive rate in kbit/s   (big-endian floats)
+FEEDBACK_MAGIC = b"FBK1"
+FEEDBACK_FORMAT = ">4sfff"
+FEEDBACK_SIZE = struct.calcsize(FEEDBACK_FORMAT)
+
+# v2 senders that set CAP_ACK also get, after every read that brought frames or heartbeats:
+#   b"ACK2" | newest sequence number | its capture timestamp (echoed)
+ACK_MAGIC = b"ACK2"
+ACK_FORMAT = ">4sQd"
+ACK_SIZE = struct.calcsize(ACK_FORMAT)
+
+CONTROL_MESSAGES = {FEEDBACK_MAGIC: (FEEDBACK_FORMAT, FEEDBACK_SIZE), ACK_MAGIC: (ACK_FORMAT, ACK_SIZE)}
+
+
+def pack_feedback(recv_fps, infer_fps, recv_kbps):
+    return struct.pack(FEEDBACK_FORMAT, FEEDBACK_MAGIC, recv_fps, infer_fps, recv_kbps)
+
+
+def pack_ack(seq, capture_time):
+    return struct.pack(ACK_FORMAT, ACK_MAGIC, seq, capture_time)
+
+
+class FeedbackReader:
+    """Collects feedback and ack messages from the non-blocking reads done by the sender."""
+    def __init__(self):
+        self._buffer = bytearray()
+        self.acks = []          # (seq, capture_time) received since the last take_acks()
+        self.messages = 0       # complete messages received, to notice a silent backend
+
+    def feed(self, data):
+        """Adds received bytes. Returns the newest complete (recv_fps, infer_fps, recv_kbps) or None."""
+        self._buffer += data
+        latest = None
+        while len(self._buffer) >= len(FEEDBACK_MAGIC):
+            message = CONTROL_MESSAGES.get(bytes(self._buffer[:len(FEEDBACK_MAGIC)]))
+            if message is None:
+                # Out of step: skip ahead to the next message start
+                starts = [i for i in (self._buffer.find(magic, 1) for magic in CONTROL_MESSAGES) if i > 0]
+                del self._buffer[:min(starts) if starts else len(self._buffer) - len(FEEDBACK_MAGIC) + 1]
+                continue
+            message_format, message_size = message
+            if len(self._buffer) < message_size:
+                break
+            fields = struct.unpack_from(message_format, self._buffer)
+            del self._buffer[:message_size]
+            self.messages += 1
+            if fields[0] == ACK_MAGIC:
+                self.acks.append(fields[1:])
+            else:
+                latest = fields[1:]
+        return latest
+
+    def take_acks(self):
+        acks, self.acks = self.acks, []
+        return acks
+
+
+# =================================================================
+# Section 5: Protocol v2
+# =================================================================
+PROTOCOL_VERSION = 2
+
+# Backend -> sender right after a v2 hello:
+#   b"WEL2" | protocol version spoken | accepted capability flags | last sequence number seen for the camera
+WELCOME_MAGIC = b"WEL2"
+WELCOME_FORMAT = ">4sBBQ"
+WELCOME_SIZE = struct.calcsize(WELCOME_FORMAT)
+
+# Sender -> backend, every message:
+#   b"FRM2" | version | kind | codec | id length | sequence number | capture time | payload length
+#   followed by the camera id (UTF-8) and the payload
+V2_MAGIC = b"FRM2"
+V2_HEADER_FORMAT = ">4sBBBBQdI"
+V2_HEADER_SIZE = struct.calcsize(V2_HEADER_FORMAT)
+
+KIND_FRAME = 1
+KIND_HEARTBEAT = 2                   # no payload; seq is the last frame sent, capture time the send time
+CODEC_NONE = 0
+CODEC_JPEG = 1
+
+FrameHeader = namedtuple("FrameHeader", "kind codec seq capture_time camera_id")
+
+
+def pack_welcome(last_seq, flags, version=PROTOCOL_VERSION):
+    return struct.pack(WELCOME_FORMAT, WELCOME_MAGIC, version, flags, last_seq)
+
+
+def parse_welcome(data):
+    """Returns (version, flags, last_seq) of a complete welcome message."""
+    magic, version, flags, last_seq = struct.unpack(WELCOME_FORMAT, data[:WELCOME_SIZE])
+    if magic != WELCOME_MAGIC:
+        raise ProtocolError(f"Expected a welcome message, got {magic!r}")
+    return version, flags, last_seq
+
+
+def pack_message(camera_id, kind, seq, capture_time, payload=b"", codec=CODEC_NONE):
+    """Builds one v2 message; camera_id is the encoded ID (see encode_camera_id)."""
+    return struct.pack(V2_HEADER_FORMAT, V2_MAGIC, PROTOCOL_VERSION, kind, codec, len(camera_id),
+                       seq, capture_time, len(payload)) + camera_id + payload
+
+
+def pack_frame_v2(camera_id, seq, capture_time, jpeg_bytes):
+    return pack_message(camera_id, KIND_FRAME, seq, capture_time, jpeg_bytes, CODEC_JPEG)
+
+
+def pack_heartbeat(camera_id, seq, sent_time):
+    return pack_message(camera_id, KIND_HEARTBEAT, seq, sent_time)